@@ -176,8 +176,11 @@ def create_function_chat_tab():
                 # Run the assistant logic (handles history internally, calls LLM, tools)
                 assistant.run_assistant(last_prompt)
 
-                # After run_assistant completes, check memory for chart data
-                # and get the last response text
+                # After run_assistant returns, render the streamed answer if there is one.
+                # The stream also carries text from tool call turns, so the message kept
+                # is the final response from history; then check memory for chart data
+                if assistant.is_streaming:
+                    status_placeholder.write_stream(assistant.stream_assistant_response())
                 final_content = assistant.get_last_response()
 
                 # --- Modification Start: Handle multiple charts ---
@@ -668,6 +668,13 @@ def project_future_quarters(df: pd.DataFrame, project_estimates: pd.DataFrame,
     # Sort backlog by days to complete (shortest first)
     backlog.sort(key=lambda x: x['days_to_complete'])
     
+    # Average daily task creation from completed quarters, used to project the
+    # remainder of the current quarter. Constant across the loop, so compute once.
+    completed_quarters = [q for q in actual_metrics.get('quarters', [])
+                          if q['quarter'] < current_quarter and not q.get('is_projected', True)]
+    avg_creation_per_day = (sum(q['tasks_created'] for q in completed_quarters) / (91 * len(completed_quarters))
+                            if completed_quarters else 0.0)
+    
     # For each quarter, allocate backlog tasks based on team capacity
     for quarter in quarters:
         q_num = quarter['quarter']
@@ -749,17 +756,10 @@ def project_future_quarters(df: pd.DataFrame, project_estimates: pd.DataFrame,
                 # Use actual data for tasks created if available
                 tasks_created = quarter_metrics.get('tasks_created', 0)
                 
-                if is_current_quarter:
-                    # For current quarter, project additional task creation for remaining days
-                    completed_quarters = [q for q in actual_metrics.get('quarters', [])
-                                         if q['quarter'] < current_quarter and not q.get('is_projected', True)]
-                    
-                    if completed_quarters:
-                        # Calculate average task creation rate per day from previous quarters
-                        avg_creation_per_day = sum(q['tasks_created'] for q in completed_quarters) / (91 * len(completed_quarters))
-                        # Add estimated tasks for remaining days in the quarter
-                        additional_tasks = int(avg_creation_per_day * (days_in_quarter - days_elapsed))
-                        tasks_created += additional_tasks
+                if is_current_quarter and completed_quarters:
+                    # For current quarter, add estimated tasks for the remaining days
+                    additional_tasks = int(avg_creation_per_day * (days_in_quarter - days_elapsed))
+                    tasks_created += additional_tasks
             else:
                 # For future quarters, estimate based on historical data with a trend line
                 historical_created = [q['tasks_created'] for q in actual_metrics.get('quarters', [])
@@ -822,12 +822,19 @@ def project_future_quarters(df: pd.DataFrame, project_estimates: pd.DataFrame,
                 estimated_capacity = team_capacity * 1.2  # Add 20% buffer to challenge the team
                 tasks_due = max(int(estimated_capacity), total_completed)
             
-            # Calculate completion rate as the ratio of throughput to the expected throughput
+            # Calculate completion rate as the ratio of throughput to the expected throughput,
+            # from the unrounded projections
             completion_rate = (total_completed / tasks_due * 100) if tasks_due > 0 else 0.0
             
             # Cap completion rate at 100%
             completion_rate = min(completion_rate, 100.0)
             
+            # Projections mix float capacity math with integer counts; settle on ints once
+            tasks_created = int(tasks_created)
+            total_completed = int(total_completed)
+            tasks_due = int(tasks_due)
+            tasks_in_progress = int(tasks_in_progress)
+            
             # Get unique projects for this quarter
             projects_in_quarter = set(task['project'] for task in tasks_from_backlog)
             
@@ -844,11 +851,11 @@ def project_future_quarters(df: pd.DataFrame, project_estimates: pd.DataFrame,
                 'name': quarter['name'],
                 'start_date': start_date,
                 'end_date': end_date,
-                'tasks_created': int(tasks_created),
-                'tasks_completed': int(total_completed),
-                'tasks_due': int(tasks_due),
-                'tasks_in_progress': int(tasks_in_progress),
-                'completion_rate': min(completion_rate, 100),  # Cap at 100%
+                'tasks_created': tasks_created,
+                'tasks_completed': total_completed,
+                'tasks_due': tasks_due,
+                'tasks_in_progress': tasks_in_progress,
+                'completion_rate': completion_rate,
                 'projects': projects_count,
                 'active_resources': active_resources,
                 'is_projected': True
@@ -878,8 +885,12 @@ def project_future_quarters(df: pd.DataFrame, project_estimates: pd.DataFrame,
     if current_fiscal_year == current_fy:
         total_projects = len(project_estimates)
         if total_projects > 0:
-            completed_count = sum(1 for _, project in project_estimates.iterrows()
-                                if project.get('remaining_tasks', 0) == 0)
+            remaining = project_estimates.get('remaining_tasks')
+            if remaining is None:
+                # Without remaining task counts every project reads as finished
+                completed_count = total_projects
+            else:
+                completed_count = int((remaining == 0).sum())
             
             # Weight completion rate by project completion status
             project_completion_pct = (completed_count / total_projects) * 100 if total_projects > 0 else 0
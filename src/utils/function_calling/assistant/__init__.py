@@ -127,7 +127,7 @@ class FunctionCallingAssistant:
             self.conversation.add_user_message(prompt)
             
             # Stream response
-            return self.streaming.stream_response_with_tool_calls(prompt, stream_callback)
+            yield from self.streaming.iter_response_with_tool_calls(prompt, stream_callback)
         except Exception as e:
             # Handle error
             error_response = self.error_manager.handle_llm_error(e, prompt)
@@ -269,7 +269,7 @@ class FunctionCallingAssistant:
         self.base_assistant.add_message_to_history(user_message)
         
         # Stream response
-        response_generator = self.streaming.stream_response_with_tool_calls(query)
+        response_generator = self.streaming.iter_response_with_tool_calls(query)
         collected_response = ""
         
         # Process response chunks
@@ -4,25 +4,26 @@ Base class for function calling assistant.
 This module provides the base FunctionCallingAssistant class that handles
 the core functionality for interacting with the OpenAI API.
 """
+import sys
 import logging
 import json
 import time
+import hashlib
+import itertools
+from collections import OrderedDict, deque
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.io as pio
-import plotly.subplots as sp
-import plotly.colors as colors
-import plotly.figure_factory as ff
-import plotly.graph_objects as go
 
 from typing import Dict, Any, List, Optional, Callable, Generator, Tuple, Union
 from datetime import datetime
-import copy # Import copy for deep copying history
 
+import orjson
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from openai import OpenAI, RateLimitError, APIError, OpenAIError # Import specific errors
-from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 from tenacity import (
     retry, stop_after_attempt, wait_exponential_jitter,
     retry_if_exception_type
@@ -36,7 +37,7 @@ from src.utils.function_calling.utils import (
     serialize_response,
     json_dumps
 )
-from src.utils.function_calling.utils.validators import validate_function_args
+from src.utils.function_calling.utils.validators import validate_function_args, compile_args_validator
 
 # Define the system prompt
 SYSTEM_PROMPT = """
@@ -77,6 +78,85 @@ General Guidelines:
 - Use your tools wisely based on the user's request and the information available. Try to understand the users intent and provide data driven answers and advice. 
 """
 
+# Shared system message for every API request; built once rather than per call
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Tool definitions sent with every request; the schema is static, so every assistant shares one list
+FUNCTION_DEFINITIONS = get_function_definitions()
+
+# Argument validators compiled from the tool schemas, keyed by function name
+ARGS_VALIDATORS = {
+    definition["function"]["name"]: compile_args_validator(definition["function"]["parameters"])
+    for definition in FUNCTION_DEFINITIONS
+}
+
+# Fields of a tool call kept when it is stored in history
+TOOL_CALL_FIELDS = {"id", "type", "function"}
+
+# Largest tool call argument string that will be parsed
+MAX_TOOL_ARGS_CHARS = 2_000_000
+
+# Number of processed tool call IDs remembered for skipping repeats
+MAX_TRACKED_TOOL_CALL_IDS = 10_000
+
+# Upper bound on tool functions executed concurrently for one LLM response
+MAX_TOOL_WORKERS = 8
+
+# Maximum number of messages kept in conversation_history (the system prompt is kept separately)
+MAX_HISTORY_MESSAGES = 40
+
+# Tool responses longer than this are sent only once; identical repeats become a reference
+PAYLOAD_DEDUP_MIN_CHARS = 4096
+
+# Read-only tools whose results may be reused for identical calls within a short window
+CACHEABLE_FUNCTIONS = frozenset({
+    "get_portfolio_projects",
+    "get_project_details",
+    "get_project_gid_by_name",
+    "get_project_info_by_name",
+    "get_projects_by_owner",
+    "get_project_tasks",
+    "get_task_details",
+    "search_tasks",
+    "get_task_subtasks",
+    "get_task_by_name",
+    "get_tasks_by_assignee",
+    "get_task_distribution_by_assignee",
+    "get_task_completion_trend",
+    "get_project_progress",
+})
+
+class RecentIdSet:
+    """
+    Set of IDs that only remembers the most recently added ones.
+
+    Used to track processed tool call IDs so the bookkeeping stays bounded in
+    long sessions; once full, the oldest ID is forgotten on each add.
+    """
+
+    def __init__(self, maxlen: int = MAX_TRACKED_TOOL_CALL_IDS):
+        self.maxlen = maxlen
+        self._ids = OrderedDict()
+
+    def add(self, item: str) -> None:
+        self._ids[item] = None
+        self._ids.move_to_end(item)
+        if len(self._ids) > self.maxlen:
+            self._ids.popitem(last=False)
+
+    def discard(self, item: str) -> None:
+        self._ids.pop(item, None)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
 class BaseFunctionCallingAssistant:
     """
     Base class for function calling assistant.
@@ -103,10 +183,16 @@ class BaseFunctionCallingAssistant:
         self.tools = AsanaToolSet(self.api_client, assistant_memory=self.memory)
         self.client = None # OpenAI client, set in setup_llm
         self.model = "gpt-4o" # Default model
-        self.conversation_history = []
+        self.conversation_history = deque() # Bounded to MAX_HISTORY_MESSAGES by _trim_history
+        self._last_assistant_message = None # Latest assistant message added to history
         # self.memory = {} # Redundant: Initialized before toolset
-        self.processed_tool_call_ids = set()
+        self.processed_tool_call_ids = RecentIdSet()
+        self._payload_store = {} # Hash of large tool response content -> (tool_call_id carrying it in history, content)
+        self._payload_origins = {} # tool_call_id -> hash, for tool messages in history carrying a full payload
         self.system_prompt = SYSTEM_PROMPT # Store system prompt
+        self.system_message = SYSTEM_MESSAGE
+        # System prompt sent ahead of conversation_history; never trimmed
+        self._api_system_message = self.system_message
 
         # Define available functions mapping names to methods
         self.available_functions = {
@@ -141,15 +227,19 @@ class BaseFunctionCallingAssistant:
             # Point directly to the implementation in ReportingTools
             "create_direct_chart": self.tools.reporting_tools.create_direct_chart
         }
+        # Functions without side effects, safe to answer from a result cache
+        self.cacheable_functions = CACHEABLE_FUNCTIONS
 
         # Get function definitions from schema
-        self.function_definitions = get_function_definitions()
+        self.function_definitions = FUNCTION_DEFINITIONS
 
         # Setup LLM client immediately on init
         self.setup_llm(api_key=openai_api_key)
 
         # Flag to indicate if the last response was streamed
         self.is_streaming = False
+        # Tool calls assembled from the most recent streamed response
+        self.streamed_tool_calls = []
 
 
     def setup_llm(self, api_key: Optional[str] = None, model: str = "gpt-4o") -> None:
@@ -184,14 +274,75 @@ class BaseFunctionCallingAssistant:
              message["content"] = str(message["content"]) # Convert non-string content
 
         # Add message
-        self.conversation_history.append(message)
-        self.logger.debug(f"Added message: Role={message['role']}, Content={'<content present>' if message.get('content') else '<no content>'}, ToolCalls={'Yes' if message.get('tool_calls') else 'No'}")
+        if message["role"] == "system" and not self.conversation_history:
+            # History brings its own system prompt; use it in place of the default
+            self._api_system_message = message
+        else:
+            self.conversation_history.append(message)
+            self._trim_history()
+        if message["role"] == "assistant":
+            self._last_assistant_message = message
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Added message: Role={message['role']}, Content={'<content present>' if message.get('content') else '<no content>'}, ToolCalls={'Yes' if message.get('tool_calls') else 'No'}")
+
+
+    def _trim_history(self) -> None:
+        """
+        Drop the oldest messages once there are more than MAX_HISTORY_MESSAGES.
+
+        Tool responses left at the front without the assistant message that
+        requested them are dropped too, so the API never sees an orphaned
+        tool message.
+        """
+        history = self.conversation_history
+        if len(history) <= MAX_HISTORY_MESSAGES:
+            return
 
+        while len(history) > MAX_HISTORY_MESSAGES or (history and history[0]["role"] == "tool"):
+            dropped = history.popleft()
+            if dropped["role"] == "tool" and dropped.get("tool_call_id") in self._payload_origins:
+                self._reinline_payload(dropped["tool_call_id"])
+
+    def _reinline_payload(self, tool_call_id: str) -> None:
+        """
+        Move a deduplicated payload whose original tool message was trimmed.
+
+        The oldest tool message still in history that referenced it gets the
+        full content back and becomes the new original; later references are
+        pointed at it. With no references left the payload is forgotten, so
+        the next identical result is sent in full.
+
+        Args:
+            tool_call_id: ID of the trimmed tool message that carried the payload.
+        """
+        digest = self._payload_origins.pop(tool_call_id)
+        _, content = self._payload_store.pop(digest)
+        old_ref = self._payload_ref_content(tool_call_id)
+
+        new_id = None
+        for message in self.conversation_history:
+            if message["role"] != "tool" or message.get("content") != old_ref:
+                continue
+            if new_id is None:
+                new_id = message["tool_call_id"]
+                message["content"] = content
+                self._payload_store[digest] = (new_id, content)
+                self._payload_origins[new_id] = digest
+                new_ref = self._payload_ref_content(new_id)
+            else:
+                message["content"] = new_ref
+
+        if new_id is not None:
+            self.logger.info(f"Re-inlined payload from trimmed tool call {tool_call_id} into {new_id}.")
 
     def clear_conversation_history(self) -> None:
         """Clear the conversation history and memory."""
-        self.conversation_history = []
-        self.processed_tool_call_ids = set()
+        self.conversation_history.clear()
+        self._last_assistant_message = None
+        self._api_system_message = self.system_message
+        self._payload_store = {}
+        self._payload_origins = {}
+        self.processed_tool_call_ids = RecentIdSet()
         self.memory = {}
         self.logger.info("Conversation history and memory cleared")
 
@@ -199,6 +350,10 @@ class BaseFunctionCallingAssistant:
         """Get the conversation history."""
         return self.conversation_history
 
+    def get_history_for_api(self) -> List[Dict[str, Any]]:
+        """Get the conversation history as sent to the API, with the system prompt first."""
+        return [self._api_system_message, *self.conversation_history]
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential_jitter(initial=1, max=10),
@@ -220,14 +375,20 @@ class BaseFunctionCallingAssistant:
             self.logger.error("LLM client not set up, call setup_llm first")
             raise ValueError("LLM client not set up")
 
-        # Prepend system prompt if not already present
-        messages_with_system = copy.deepcopy(messages) # Avoid modifying original history
-        if not messages_with_system or messages_with_system[0].get("role") != "system":
-            messages_with_system.insert(0, {"role": "system", "content": self.system_prompt})
+        # Prepend system prompt if not already present. The assistant's own history
+        # keeps its system prompt separately, so it is put in front here.
+        # Otherwise a shallow concat is enough: the SDK only reads the messages.
+        if messages is self.conversation_history:
+            messages_with_system = self.get_history_for_api()
+        elif messages and messages[0].get("role") == "system":
+            messages_with_system = messages
+        else:
+            messages_with_system = [self.system_message] + messages
             self.logger.debug("Prepended system prompt to messages for API call.")
 
         try:
-            self.logger.debug(f"Calling OpenAI API with {len(messages_with_system)} messages. Streaming={stream}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Calling OpenAI API with {len(messages_with_system)} messages. Streaming={stream}")
             response = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages_with_system,
@@ -242,7 +403,7 @@ class BaseFunctionCallingAssistant:
                 return self._stream_handler(response)
             else:
                 # Log non-streaming response details
-                if response.choices:
+                if response.choices and self.logger.isEnabledFor(logging.DEBUG):
                     choice = response.choices[0]
                     message = choice.message
                     content_log = (message.content[:100] + '...') if message.content and len(message.content) > 100 else message.content
@@ -258,20 +419,47 @@ class BaseFunctionCallingAssistant:
             raise
 
     def _stream_handler(self, response_stream) -> Generator[str, None, None]:
-        """Handles the streaming response generator."""
-        accumulated_content = ""
+        """
+        Handles the streaming response generator.
+
+        Content deltas are yielded as they arrive. Tool call deltas are merged by
+        index and, once the stream ends, stored in self.streamed_tool_calls in the
+        same shape as a non-streaming response's tool_calls. Errors raised while
+        reading the stream propagate to the caller.
+        """
+        content_parts = []
+        tool_call_parts = [] # Per index: {"id", "name", "arguments": [fragments]}
+        self.streamed_tool_calls = []
         try:
             for chunk in response_stream:
                 delta = chunk.choices[0].delta if chunk.choices else None
-                content_chunk = delta.content if delta else None
+                if not delta:
+                    continue
+                for tc_delta in delta.tool_calls or ():
+                    while len(tool_call_parts) <= tc_delta.index:
+                        tool_call_parts.append({"id": "", "name": "", "arguments": []})
+                    parts = tool_call_parts[tc_delta.index]
+                    if tc_delta.id:
+                        parts["id"] = tc_delta.id
+                    if tc_delta.function:
+                        if tc_delta.function.name:
+                            parts["name"] += tc_delta.function.name
+                        if tc_delta.function.arguments:
+                            parts["arguments"].append(tc_delta.function.arguments)
+                content_chunk = delta.content
                 if content_chunk:
-                    accumulated_content += content_chunk
+                    content_parts.append(content_chunk)
                     yield content_chunk
-        except Exception as e:
-            self.logger.error(f"Error during response streaming: {e}", exc_info=True)
-            yield f"\n\n[Error during streaming: {e}]" # Yield error message as part of stream
+            self.streamed_tool_calls = [
+                ChatCompletionMessageToolCall(
+                    id=parts["id"],
+                    type="function",
+                    function=Function(name=parts["name"], arguments="".join(parts["arguments"]))
+                ) for parts in tool_call_parts
+            ]
         finally:
-             self.logger.debug(f"Streaming finished. Full content length: {len(accumulated_content)}")
+             if self.logger.isEnabledFor(logging.DEBUG):
+                 self.logger.debug(f"Streaming finished. Full content length: {sum(map(len, content_parts))}")
              # Note: The full response isn't stored here, it's accumulated by the caller
 
 
@@ -279,6 +467,10 @@ class BaseFunctionCallingAssistant:
         """
         Process tool calls received from the LLM response.
 
+        Arguments are parsed on the calling thread; the functions themselves are
+        mostly Asana API calls, so when several are requested they run
+        concurrently in a thread pool. Responses keep the order of tool_calls.
+
         Args:
             tool_calls: List of tool call objects from the OpenAI response.
 
@@ -289,104 +481,201 @@ class BaseFunctionCallingAssistant:
         if not tool_calls:
             return responses
 
+        # Avoid reprocessing the same tool call if retrying
+        pending = []
         for tool_call in tool_calls:
-            tool_call_id = tool_call.id
-            function_data = tool_call.function
-            function_name = function_data.name
-            function_args_str = function_data.arguments
-
-            self.logger.info(f"Processing tool call ID: {tool_call_id}, Function: {function_name}")
-            self.logger.debug(f"Raw arguments string: {function_args_str}")
-
-            # Avoid reprocessing the same tool call if retrying
-            if tool_call_id in self.processed_tool_call_ids:
-                self.logger.warning(f"Skipping already processed tool call ID: {tool_call_id}")
+            if tool_call.id in self.processed_tool_call_ids:
+                self.logger.warning(f"Skipping already processed tool call ID: {tool_call.id}")
+            else:
+                pending.append(tool_call)
+
+        # Parse arguments and resolve functions up front; errors become the response content
+        contents = [None] * len(pending)
+        calls = [] # (position, function name, callable, arguments)
+        for position, tool_call in enumerate(pending):
+            # Interned so the available_functions lookup can match on identity
+            function_name = sys.intern(tool_call.function.name)
+            function_args_str = tool_call.function.arguments
+
+            self.logger.info(f"Processing tool call ID: {tool_call.id}, Function: {function_name}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Raw arguments string: {function_args_str}")
+
+            # Refuse oversized argument blobs before spending time and memory parsing them
+            if function_args_str and len(function_args_str) > MAX_TOOL_ARGS_CHARS:
+                error_message = (f"Arguments for {function_name} are too large "
+                                 f"({len(function_args_str)} characters, limit {MAX_TOOL_ARGS_CHARS}).")
+                self.logger.error(error_message)
+                contents[position] = json_dumps({"error": error_message, "status": "error"})
                 continue
 
             try:
-                function_args = json.loads(function_args_str)
-                self.logger.debug(f"Parsed arguments: {function_args}")
+                function_args = orjson.loads(function_args_str)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug(f"Parsed arguments: {function_args}")
 
                 if function_name not in self.available_functions:
                     error_message = f"Function '{function_name}' not found."
                     self.logger.error(error_message)
-                    content = json.dumps({"error": error_message, "status": "error"})
+                    contents[position] = json_dumps({"error": error_message, "status": "error"})
                 else:
-                    # Validate arguments before calling (optional but recommended)
-                    # validation_errors = validate_function_args(function_name, function_args)
-                    # if validation_errors:
-                    #     error_message = f"Invalid arguments for {function_name}: {validation_errors}"
-                    #     self.logger.error(error_message)
-                    #     content = json.dumps({"error": error_message, "status": "error"})
-                    # else:
-                    try:
-                        self.logger.info(f"Executing function: {function_name}")
-                        # Pass assistant memory to the tool context if needed
-                        # context = {"memory": self.memory} # Example context
-                        function_to_call = self.available_functions[function_name]
-                        # Ensure kwargs are passed correctly
-                        function_response = function_to_call(**function_args)
-                        self.logger.info(f"Function {function_name} executed successfully.")
-                        self.logger.debug(f"Function response: {function_response}")
-                        # Serialize response carefully
-                        content = json_dumps(serialize_response(function_response))
-
-                    except Exception as func_exc:
-                        error_message = f"Error executing function '{function_name}': {func_exc}"
-                        self.logger.error(error_message, exc_info=True)
-                        content = json.dumps({"error": error_message, "status": "error"})
-
-                responses.append({
-                    "tool_call_id": tool_call_id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": content,
-                })
-                self.processed_tool_call_ids.add(tool_call_id) # Mark as processed
+                    # Validate arguments before calling
+                    validator = ARGS_VALIDATORS.get(function_name)
+                    validation_errors = validator(function_args) if validator else []
+                    if validation_errors:
+                        error_message = f"Invalid arguments for {function_name}: {'; '.join(validation_errors)}"
+                        self.logger.error(error_message)
+                        contents[position] = json_dumps({"error": error_message, "status": "error"})
+                    else:
+                        calls.append((position, function_name, self.available_functions[function_name], function_args))
 
             except json.JSONDecodeError as json_err:
                 error_message = f"Invalid JSON arguments for {function_name}: {json_err}. Arguments: {function_args_str}"
                 self.logger.error(error_message)
-                responses.append({
-                    "tool_call_id": tool_call_id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": json.dumps({"error": error_message, "status": "error"}),
-                })
-                self.processed_tool_call_ids.add(tool_call_id)
+                contents[position] = json_dumps({"error": error_message, "status": "error"})
             except Exception as e:
                 error_message = f"Unexpected error processing tool call {function_name}: {e}"
                 self.logger.error(error_message, exc_info=True)
-                responses.append({
-                    "tool_call_id": tool_call_id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": json.dumps({"error": error_message, "status": "error"}),
-                })
-                self.processed_tool_call_ids.add(tool_call_id)
+                contents[position] = json_dumps({"error": error_message, "status": "error"})
+
+        if len(calls) == 1:
+            position, function_name, function_to_call, function_args = calls[0]
+            contents[position] = self._execute_function(function_name, function_to_call, function_args)
+        elif calls:
+            # Tools read st.session_state, so worker threads need the script run context
+            script_ctx = get_script_run_ctx()
+
+            def run_call(call):
+                add_script_run_ctx(threading.current_thread(), script_ctx)
+                return self._execute_function(*call[1:])
+
+            with ThreadPoolExecutor(max_workers=min(MAX_TOOL_WORKERS, len(calls))) as executor:
+                for call, content in zip(calls, executor.map(run_call, calls)):
+                    contents[call[0]] = content
+
+        for tool_call, content in zip(pending, contents):
+            responses.append({
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": tool_call.function.name,
+                "content": self._dedupe_payload(tool_call.id, content),
+            })
+            self.processed_tool_call_ids.add(tool_call.id) # Mark as processed
 
         return responses
 
-    def run_assistant(self, prompt: str, max_tool_turns: int = 10) -> None: # Increased default max_tool_turns to 10
+    def _dedupe_payload(self, tool_call_id: str, content: str) -> str:
+        """
+        Replace a large tool response that repeats an earlier one with a reference.
+
+        The full payload is still in the conversation history under the tool
+        call that carries it (see _reinline_payload for what happens when that
+        message is trimmed), so sending it again only costs tokens.
+
+        Args:
+            tool_call_id: ID of the tool call the content belongs to.
+            content: Serialized tool response.
+
+        Returns:
+            The content itself, or a short reference to the earlier tool call.
+        """
+        if len(content) <= PAYLOAD_DEDUP_MIN_CHARS:
+            return content
+
+        digest = hashlib.md5(content.encode()).hexdigest()
+        stored = self._payload_store.get(digest)
+        if stored is None:
+            self._payload_store[digest] = (tool_call_id, content)
+            self._payload_origins[tool_call_id] = digest
+            return content
+
+        original_id = stored[0]
+        self.logger.info(f"Tool call {tool_call_id} returned the same data as {original_id}; sending a reference.")
+        return self._payload_ref_content(original_id)
+
+    @staticmethod
+    def _payload_ref_content(original_id: str) -> str:
+        """Build the tool response content that refers to the payload of an earlier tool call."""
+        return json_dumps({
+            "status": "success",
+            "payload_ref": original_id,
+            "note": f"Result is identical to the earlier response for tool call {original_id}."
+        })
+
+    def _execute_function(self, function_name: str, function_to_call: Callable, function_args: Dict[str, Any]) -> str:
+        """
+        Run a single tool function and serialize its result for the API.
+
+        Args:
+            function_name: Name of the tool function.
+            function_to_call: The callable registered for the function.
+            function_args: Parsed arguments for the call.
+
+        Returns:
+            JSON string with the function response, or an error payload.
+        """
+        try:
+            self.logger.info(f"Executing function: {function_name}")
+            # Ensure kwargs are passed correctly
+            function_response = function_to_call(**function_args)
+            self.logger.info(f"Function {function_name} executed successfully.")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Function response: {function_response}")
+            # Serialize response carefully
+            return json_dumps(serialize_response(function_response))
+        except Exception as func_exc:
+            error_message = f"Error executing function '{function_name}': {func_exc}"
+            self.logger.error(error_message, exc_info=True)
+            return json_dumps({"error": error_message, "status": "error"})
+
+    def run_assistant(self, prompt: str, max_tool_turns: int = 10, stream: bool = True) -> None: # Increased default max_tool_turns to 10
         """
         Runs the assistant for one logical turn with the given prompt.
         Handles the conversation flow including multiple rounds of function calls if needed.
         Updates self.conversation_history and self.memory.
-        The final response is added to history; streaming is handled separately if needed.
+
+        When streaming, tool call rounds are resolved here and the call returns as soon
+        as the model starts answering in text: self.is_streaming is set and the rest of
+        the answer is read through stream_assistant_response(), which adds the final
+        response to history once consumed. Otherwise the final response is added to
+        history before returning.
 
         Args:
             prompt: The user's input prompt.
             max_tool_turns: Maximum number of tool call rounds allowed per user prompt.
+            stream: Whether to stream LLM responses.
         """
         self.logger.info(f"Running assistant with prompt: '{prompt[:100]}...'")
         self.is_streaming = False # Reset streaming flag
         self.memory.clear() # Clear memory for the new turn
-        self.processed_tool_call_ids = set() # Clear processed tool calls for the new turn
+        self.processed_tool_call_ids = RecentIdSet() # Clear processed tool calls for the new turn
 
         # 1. Add user message to history
         user_message = {"role": "user", "content": prompt}
         self.add_message_to_history(user_message)
 
+        turns = self._run_turns(max_tool_turns, stream)
+        if not stream:
+            for _ in turns:
+                pass
+            return
+
+        # Run tool rounds until the first text arrives, then hand the rest to the caller
+        first_chunk = next(turns, None)
+        if first_chunk is not None:
+            self.memory['response_stream'] = itertools.chain([first_chunk], turns)
+            self.is_streaming = True
+
+    def _run_turns(self, max_tool_turns: int, stream: bool) -> Generator[str, None, None]:
+        """
+        Runs LLM turns, processing tool calls, until the model gives a final response.
+
+        Yields response text as it arrives when streaming, plus any error message
+        added to history in either mode. The stream spans every turn, so text the
+        model wrote alongside tool calls is included; the final response alone is
+        the last assistant message in history (see get_last_response).
+        Exceptions raised while streaming end the run with an error message.
+        """
         current_tool_turn = 0
         while current_tool_turn < max_tool_turns:
             current_tool_turn += 1
@@ -394,23 +683,28 @@ class BaseFunctionCallingAssistant:
 
             try:
                 # 2. Call LLM
-                response = self.call_llm(self.conversation_history, stream=False) # Non-streaming for logic
-                response_message = response.choices[0].message
+                if stream:
+                    content_parts = []
+                    for content_chunk in self.call_llm(self.conversation_history, stream=True):
+                        content_parts.append(content_chunk)
+                        yield content_chunk
+                    content = "".join(content_parts)
+                    tool_calls = self.streamed_tool_calls
+                else:
+                    response = self.call_llm(self.conversation_history, stream=False)
+                    response_message = response.choices[0].message
+                    content = response_message.content
+                    tool_calls = response_message.tool_calls
 
                 # 3. Add Assistant's response (content and/or tool calls) to history
                 assistant_message_dict = {
                     "role": "assistant",
-                    "content": response_message.content or "" # Content can be None if only tool calls
+                    "content": content or "" # Content can be None if only tool calls
                 }
-                tool_calls = response_message.tool_calls
                 if tool_calls:
-                    # Format tool calls for history storage
+                    # Format tool calls for history storage (pydantic dumps straight to the API shape)
                     assistant_message_dict["tool_calls"] = [
-                        {
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {"name": tc.function.name, "arguments": tc.function.arguments}
-                        } for tc in tool_calls
+                        tc.model_dump(include=TOOL_CALL_FIELDS) for tc in tool_calls
                     ]
                     self.logger.info(f"LLM requested {len(tool_calls)} tool calls.")
                 else:
@@ -432,23 +726,30 @@ class BaseFunctionCallingAssistant:
                 for tool_response in tool_responses:
                     self.add_message_to_history(tool_response)
 
+                # Keep text streamed before the tool calls apart from the next turn's text
+                if stream and content:
+                    yield "\n\n"
+
                 # Continue loop to send tool results back to LLM
 
             except Exception as e:
                 self.logger.error(f"Error during LLM call or tool processing (Turn {current_tool_turn}): {e}", exc_info=True)
-                self.add_message_to_history({"role": "assistant", "content": f"Sorry, I encountered an error processing your request: {e}"})
+                error_content = f"Sorry, I encountered an error processing your request: {e}"
+                self.add_message_to_history({"role": "assistant", "content": error_content})
+                yield error_content
                 break # Exit loop on error
 
         if current_tool_turn >= max_tool_turns:
             self.logger.warning(f"Reached maximum tool turns ({max_tool_turns}). Aborting.")
-            self.add_message_to_history({"role": "assistant", "content": "Sorry, I couldn't complete the request within the allowed number of steps."})
+            error_content = "Sorry, I couldn't complete the request within the allowed number of steps."
+            self.add_message_to_history({"role": "assistant", "content": error_content})
+            yield error_content
 
     def get_last_response(self) -> Optional[str]:
         """Gets the content of the last assistant message in the history, ignoring tool calls."""
-        for message in reversed(self.conversation_history):
-            if message.get("role") == "assistant":
-                return message.get("content", "")
-        return None
+        if self._last_assistant_message is None:
+            return None
+        return self._last_assistant_message.get("content", "")
 
     def stream_assistant_response(self) -> Generator[str, None, None]:
          """
@@ -5,13 +5,97 @@ This module provides functionality for managing conversations with the user,
 including storing and retrieving conversation history, system prompts, etc.
 """
 import logging
-import json
+import sys
+import time
+from collections import deque
+from collections.abc import Sequence
+from itertools import chain
 from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
 
-import streamlit as st
-
 from src.utils.function_calling.utils.formatting import format_message_for_display
+from src.utils.function_calling.utils.serialization import json_dumps
+
+# Default system prompt, shared by every conversation manager
+DEFAULT_SYSTEM_PROMPT = (
+    "You are an Asana assistant that helps users get information about their "
+    "Asana projects, tasks, and teams. You can search for projects, get task "
+    "details, and generate reports and visualizations based on Asana data. "
+    "When the user asks a question that requires data from Asana, use the "
+    "available functions to get the data you need.\n\n"
+    "Remember the following:\n"
+    "1. Always try to get specific information the user needs using the available functions.\n"
+    "2. For tasks related to analytics or reporting, create visualizations when appropriate.\n"
+    "3. Be conversational but concise in your responses.\n"
+    "4. If you need to show data in a table, format it clearly for readability.\n"
+    "5. When you're not sure which project, task, or user the user is referring to, "
+    "ask clarifying questions or search for the information."
+)
+
+# Maximum number of non-system messages kept in the conversation
+MAX_DIALOG_MESSAGES = 100
+
+# Message roles. Stored messages are only ever built here with these constants,
+# so role checks on them can compare by identity
+_ROLE_SYSTEM = sys.intern("system")
+_ROLE_USER = sys.intern("user")
+_ROLE_ASSISTANT = sys.intern("assistant")
+_ROLE_TOOL = sys.intern("tool")
+
+
+def format_timestamp_ns(timestamp_ns: Optional[int]) -> str:
+    """
+    Format a message timestamp for display.
+    
+    Messages store time.time_ns() when added; the ISO string is only built
+    when a formatted view is requested.
+    
+    Args:
+        timestamp_ns: Nanoseconds since the epoch, or None
+        
+    Returns:
+        ISO 8601 timestamp string, or an empty string if no timestamp
+    """
+    if timestamp_ns is None:
+        return ""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
+
+class _ReadOnlySeq(Sequence):
+    """
+    Read-only view over the system messages followed by the dialog messages.
+    
+    The view reads the manager's lists directly, so it always reflects the
+    current history without copying it.
+    """
+    
+    __slots__ = ("_system_messages", "_dialog_messages")
+    
+    def __init__(self, system_messages: List[Dict[str, Any]], dialog_messages: deque):
+        self._system_messages = system_messages
+        self._dialog_messages = dialog_messages
+    
+    def __len__(self) -> int:
+        return len(self._system_messages) + len(self._dialog_messages)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        
+        system_count = len(self._system_messages)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("history index out of range")
+        if index < system_count:
+            return self._system_messages[index]
+        return self._dialog_messages[index - system_count]
+    
+    def __iter__(self):
+        return chain(self._system_messages, self._dialog_messages)
+    
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self)!r})"
 
 
 class ConversationManager:
@@ -22,19 +106,43 @@ class ConversationManager:
     formatting and managing the conversation.
     """
     
+    __slots__ = (
+        "_system_messages", "_dialog_messages", "logger", "system_prompt",
+        "_api_system_message", "_api_cache", "tool_call_count", "token_count",
+        "message_count", "user_messages", "assistant_messages", "start_time",
+        "metadata", "_history_view"
+    )
+    
     def __init__(self):
         """
         Initialize the conversation manager.
         """
-        self.messages = []
+        # System messages are kept apart from the dialog so the API and display
+        # views can walk the dialog without filtering by role
+        self._system_messages = []
+        self._dialog_messages = deque()
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.system_prompt = self._get_default_system_prompt()
+        self.system_prompt = DEFAULT_SYSTEM_PROMPT
+        
+        # Built once; stays valid because the message lists are only cleared in place
+        self._history_view = _ReadOnlySeq(self._system_messages, self._dialog_messages)
+        
+        # API-shaped messages, built once per message and only ever appended to,
+        # so the prefix sent to the API stays identical between turns (prompt caching)
+        self._api_system_message = {"role": _ROLE_SYSTEM, "content": self.system_prompt}
+        self._api_cache = deque()
+        
         self.tool_call_count = 0
         self.token_count = 0
         
         # Initialize statistics
         self.message_count = 0
+        self.user_messages = 0
+        self.assistant_messages = 0
         self.start_time = datetime.now()
+        
+        # Arbitrary caller-supplied values, see set_metadata/get_metadata
+        self.metadata: Dict[str, Any] = {}
     
     def _get_default_system_prompt(self) -> str:
         """
@@ -43,20 +151,7 @@ class ConversationManager:
         Returns:
             Default system prompt string
         """
-        return (
-            "You are an Asana assistant that helps users get information about their "
-            "Asana projects, tasks, and teams. You can search for projects, get task "
-            "details, and generate reports and visualizations based on Asana data. "
-            "When the user asks a question that requires data from Asana, use the "
-            "available functions to get the data you need.\n\n"
-            "Remember the following:\n"
-            "1. Always try to get specific information the user needs using the available functions.\n"
-            "2. For tasks related to analytics or reporting, create visualizations when appropriate.\n"
-            "3. Be conversational but concise in your responses.\n"
-            "4. If you need to show data in a table, format it clearly for readability.\n"
-            "5. When you're not sure which project, task, or user the user is referring to, "
-            "ask clarifying questions or search for the information."
-        )
+        return DEFAULT_SYSTEM_PROMPT
     
     def set_system_prompt(self, prompt: str) -> None:
         """
@@ -66,6 +161,7 @@ class ConversationManager:
             prompt: System prompt string
         """
         self.system_prompt = prompt
+        self._api_system_message = {"role": _ROLE_SYSTEM, "content": prompt}
         self.logger.info("System prompt updated")
     
     def get_system_prompt(self) -> str:
@@ -88,12 +184,12 @@ class ConversationManager:
             Message dictionary
         """
         message = {
-            "role": "system",
+            "role": _ROLE_SYSTEM,
             "content": content,
-            "timestamp": datetime.now().isoformat()
+            "timestamp_ns": time.time_ns()
         }
         
-        self.messages.append(message)
+        self._system_messages.append(message)
         self.message_count += 1
         
         return message
@@ -109,13 +205,16 @@ class ConversationManager:
             Message dictionary
         """
         message = {
-            "role": "user",
+            "role": _ROLE_USER,
             "content": content,
-            "timestamp": datetime.now().isoformat()
+            "timestamp_ns": time.time_ns()
         }
         
-        self.messages.append(message)
+        self._dialog_messages.append(message)
+        self._api_cache.append(self._to_api_message(message))
+        self._trim_dialog()
         self.message_count += 1
+        self.user_messages += 1
         
         return message
     
@@ -131,23 +230,36 @@ class ConversationManager:
             tool_calls_count: Number of tool calls in the message
             
         Returns:
-            Message dictionary
+            Message dictionary; the has_tool_calls and tool_calls_count keys
+            are only present when the message has tool calls
         """
-        message = {
-            "role": "assistant",
-            "content": content,
-            "timestamp": datetime.now().isoformat(),
-            "has_tool_calls": has_tool_calls,
-            "tool_calls_count": tool_calls_count
-        }
+        timestamp_ns = time.time_ns()
         
-        self.messages.append(message)
-        self.message_count += 1
-        
-        # Update statistics
-        if has_tool_calls:
+        if not has_tool_calls:
+            # Common case: a plain reply, stored without the tool call keys
+            message = {
+                "role": _ROLE_ASSISTANT,
+                "content": content,
+                "timestamp_ns": timestamp_ns
+            }
+        else:
+            message = {
+                "role": _ROLE_ASSISTANT,
+                "content": content,
+                "timestamp_ns": timestamp_ns,
+                "has_tool_calls": True,
+                "tool_calls_count": tool_calls_count
+            }
+            
+            # Update statistics
             self.tool_call_count += tool_calls_count
         
+        self._dialog_messages.append(message)
+        self._api_cache.append({"role": _ROLE_ASSISTANT, "content": content})
+        self._trim_dialog()
+        self.message_count += 1
+        self.assistant_messages += 1
+        
         return message
     
     def add_tool_message(self, name: str, content: Union[str, Dict[str, Any]], 
@@ -165,70 +277,104 @@ class ConversationManager:
         """
         # Convert content to string if it's a dictionary
         if isinstance(content, dict):
-            content_str = json.dumps(content)
+            content_str = json_dumps(content)
         else:
             content_str = content
         
         message = {
-            "role": "tool",
+            "role": _ROLE_TOOL,
             "name": name,
             "content": content_str,
             "tool_call_id": tool_call_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp_ns": time.time_ns()
         }
         
-        self.messages.append(message)
+        self._dialog_messages.append(message)
+        self._api_cache.append(self._to_api_message(message))
+        self._trim_dialog()
         
         return message
     
-    def get_history(self) -> List[Dict[str, Any]]:
+    def _trim_dialog(self) -> None:
+        """
+        Drop the oldest dialog messages once there are more than MAX_DIALOG_MESSAGES.
+        
+        Tool responses left at the front without the assistant message that
+        requested them are dropped too, so the API never sees an orphaned
+        tool message.
+        """
+        dialog = self._dialog_messages
+        if len(dialog) <= MAX_DIALOG_MESSAGES:
+            return
+        
+        api_cache = self._api_cache
+        while len(dialog) > MAX_DIALOG_MESSAGES or (dialog and dialog[0]["role"] is _ROLE_TOOL):
+            dialog.popleft()
+            api_cache.popleft()
+    
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """All messages: system messages followed by the dialog."""
+        return self._system_messages + list(self._dialog_messages)
+    
+    def get_history(self) -> Sequence:
         """
         Get the full conversation history.
         
         Returns:
-            List of message dictionaries
+            Read-only sequence of message dictionaries, system messages first.
+            It tracks the live history; take list() of it for a snapshot.
         """
-        return self.messages
+        return self._history_view
+    
+    @staticmethod
+    def _to_api_message(message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Project a stored message onto the fields the OpenAI API accepts.
+        
+        Args:
+            message: Message dictionary from the history
+            
+        Returns:
+            Message dictionary formatted for the API
+        """
+        # Copy relevant fields for API
+        api_message = {
+            "role": message["role"],
+            "content": message.get("content", "")
+        }
+        
+        # Add tool-specific fields
+        if message["role"] is _ROLE_TOOL:
+            api_message["name"] = message["name"]
+            api_message["tool_call_id"] = message["tool_call_id"]
+        
+        # Add tool_calls if present
+        if "tool_calls" in message:
+            api_message["tool_calls"] = message["tool_calls"]
+        
+        return api_message
     
     def get_history_for_api(self) -> List[Dict[str, Any]]:
         """
         Get the conversation history formatted for the OpenAI API.
         
+        The system prompt comes first, followed by the non-system messages
+        as projected when they were added.
+        
         Returns:
             List of message dictionaries formatted for the API
         """
-        # Start with the system message
-        api_messages = [{"role": "system", "content": self.system_prompt}]
-        
-        # Add the rest of the messages
-        for message in self.messages:
-            # Skip system messages (we already added our system prompt)
-            if message["role"] == "system":
-                continue
-            
-            # Copy relevant fields for API
-            api_message = {
-                "role": message["role"],
-                "content": message.get("content", "")
-            }
-            
-            # Add tool-specific fields
-            if message["role"] == "tool":
-                api_message["name"] = message["name"]
-                api_message["tool_call_id"] = message["tool_call_id"]
-            
-            # Add tool_calls if present
-            if "tool_calls" in message:
-                api_message["tool_calls"] = message["tool_calls"]
-            
-            api_messages.append(api_message)
-        
-        return api_messages
+        return [self._api_system_message, *self._api_cache]
     
     def clear_history(self) -> None:
         """Clear the conversation history."""
-        self.messages = []
+        self._system_messages.clear()
+        self._dialog_messages.clear()
+        self._api_cache.clear()
         self.message_count = 0
+        self.user_messages = 0
+        self.assistant_messages = 0
         self.tool_call_count = 0
         self.token_count = 0
         self.start_time = datetime.now()
@@ -241,23 +387,17 @@ class ConversationManager:
         Returns:
             List of formatted message dictionaries
         """
-        formatted_history = []
+        format_message = format_message_for_display
+        format_timestamp = format_timestamp_ns
         
-        for message in self.messages:
-            # Skip system messages
-            if message["role"] == "system":
-                continue
-            
-            # Format the message
-            formatted_message = {
+        return [
+            {
                 "role": message["role"],
-                "content": format_message_for_display(message),
-                "timestamp": message.get("timestamp", "")
+                "content": format_message(message),
+                "timestamp": format_timestamp(message.get("timestamp_ns"))
             }
-            
-            formatted_history.append(formatted_message)
-        
-        return formatted_history
+            for message in self._dialog_messages
+        ]
     
     def get_conversation_stats(self) -> Dict[str, Any]:
         """
@@ -270,21 +410,13 @@ class ConversationManager:
         duration = datetime.now() - self.start_time
         duration_seconds = duration.total_seconds()
         
-        # Count messages by role
-        user_messages = sum(1 for m in self.messages if m["role"] == "user")
-        assistant_messages = sum(1 for m in self.messages if m["role"] == "assistant")
-        
-        # Reset statistics
-        self.tool_call_count = 0
-        self.token_count = 0
-        
         return {
-            "history_length": len(self.get_formatted_history()),
-            "message_count": len(self.messages),
+            "history_length": len(self._dialog_messages),
+            "message_count": len(self._system_messages) + len(self._dialog_messages),
             "tool_call_count": self.tool_call_count,
             "token_count": self.token_count,
-            "user_messages": user_messages,
-            "assistant_messages": assistant_messages,
+            "user_messages": self.user_messages,
+            "assistant_messages": self.assistant_messages,
             "duration_seconds": duration_seconds,
             "start_time": self.start_time.isoformat(),
             "current_time": datetime.now().isoformat()
@@ -4,20 +4,38 @@ Error handling module for function calling assistant.
 This module provides functionality for handling and recovering from errors
 that occur during function calling and LLM interaction.
 """
+import functools
 import logging
+import random
+import time
 import traceback
 import json
+from collections import deque
 from typing import Dict, Any, List, Optional, Callable, TypeVar, Generic, Union
 
-import streamlit as st
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 from openai.types.chat import ChatCompletion, ChatCompletionMessage
 
-from src.utils.function_calling.utils.formatting import truncate_text
-
 
 # Define a type variable for the error handler decorator
 T = TypeVar('T')
 
+# Retry backoff settings for error_handler
+MAX_BACKOFF_SECONDS = 30
+RETRY_TIME_BUDGET_SECONDS = 60
+
+# Number of errors kept in the error history
+MAX_ERROR_HISTORY = 200
+
+# Error type names used by should_retry, by exception class. APITimeoutError
+# subclasses APIConnectionError, so it has to be checked first
+_ERROR_TYPES = (
+    (RateLimitError, "rate_limit"),
+    (APITimeoutError, "timeout"),
+    (APIConnectionError, "connection_error"),
+    (InternalServerError, "server_error"),
+)
+
 
 class ErrorManager:
     """
@@ -27,15 +45,26 @@ class ErrorManager:
     that occur during function calling and LLM interaction.
     """
     
+    # Error types that are worth retrying
+    _RETRYABLE = frozenset({
+        "rate_limit",
+        "timeout",
+        "connection_error",
+        "server_error"
+    })
+    
     def __init__(self):
         """Initialize the error manager."""
         self.logger = logging.getLogger(self.__class__.__name__)
         
-        # Initialize error history
-        self.error_history = []
+        # Initialize error history, keeping only the most recent errors
+        self.error_history = deque(maxlen=MAX_ERROR_HISTORY)
         
         # Set maximum retries
         self.max_retries = 3
+        
+        # Keep tracebacks in the error history (always done when debug logging is on)
+        self.capture_tracebacks = False
     
     def handle_llm_error(self, error: Exception, 
                         prompt: Optional[str] = None) -> Dict[str, Any]:
@@ -52,10 +81,11 @@ class ErrorManager:
         error_message = str(error)
         error_type = type(error).__name__
         
-        # Log the error
-        self.logger.error(f"LLM API error: {error_type}: {error_message}")
-        if prompt:
-            self.logger.debug(f"Prompt that caused error: {truncate_text(prompt, 100)}")
+        # Log the error once; the prompt travels as structured data rather than text
+        self.logger.error(
+            "LLM API error: %s: %s", error_type, error_message,
+            extra={"error_type": error_type, "error_message": error_message, "prompt": prompt}
+        )
         
         # Add to error history
         self.error_history.append({
@@ -63,7 +93,7 @@ class ErrorManager:
             "error_type": error_type,
             "error_message": error_message,
             "prompt": prompt,
-            "traceback": traceback.format_exc()
+            "traceback": self._capture_traceback(error)
         })
         
         # Create error response
@@ -93,12 +123,14 @@ class ErrorManager:
         error_message = str(error)
         error_type = type(error).__name__
         
-        # Log the error
-        self.logger.error(f"Tool call error: {error_type}: {error_message}")
-        if function_name:
-            self.logger.debug(f"Function that caused error: {function_name}")
-        if args:
-            self.logger.debug(f"Arguments: {args}")
+        # Log the error once; the arguments travel as structured data and are
+        # never formatted unless a handler asks for them ("args" is reserved
+        # on LogRecord, hence "tool_args")
+        self.logger.error(
+            "Tool call error in %s: %s: %s", function_name, error_type, error_message,
+            extra={"error_type": error_type, "error_message": error_message,
+                   "function_name": function_name, "tool_args": args}
+        )
         
         # Add to error history
         self.error_history.append({
@@ -107,7 +139,7 @@ class ErrorManager:
             "error_message": error_message,
             "function_name": function_name,
             "args": args,
-            "traceback": traceback.format_exc()
+            "traceback": self._capture_traceback(error)
         })
         
         # Create error response
@@ -213,23 +245,74 @@ class ErrorManager:
         Returns:
             True if the operation should be retried, False otherwise
         """
-        # Check if we've exceeded the maximum retries
-        if retry_count >= self.max_retries:
-            return False
-        
-        # Determine if this error type is retryable
-        retryable_errors = [
-            "rate_limit",
-            "timeout",
-            "connection_error",
-            "server_error"
-        ]
-        
-        return error_type in retryable_errors
+        return retry_count < self.max_retries and error_type in self._RETRYABLE
+    
+    @staticmethod
+    def _classify_error(error: Exception) -> str:
+        """
+        Get the error type name for an exception, as used by should_retry.
+        
+        Args:
+            error: Exception to classify
+            
+        Returns:
+            "rate_limit", "timeout", "connection_error" or "server_error" for
+            the matching OpenAI errors, otherwise the exception's class name
+        """
+        for error_class, error_type in _ERROR_TYPES:
+            if isinstance(error, error_class):
+                return error_type
+        return type(error).__name__
+    
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """
+        Read the server's requested retry delay from an API error's response headers.
+        
+        Args:
+            error: Exception raised by the API client
+            
+        Returns:
+            Delay in seconds, or None if the response does not give one
+        """
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        
+        try:
+            retry_after_ms = headers.get("retry-after-ms")
+            if retry_after_ms is not None:
+                return float(retry_after_ms) / 1000
+            retry_after = headers.get("retry-after")
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            # retry-after can also be an HTTP date; fall back to our own backoff
+            pass
+        return None
+    
+    def _capture_traceback(self, error: Exception) -> Optional[traceback.TracebackException]:
+        """
+        Capture an exception's traceback without formatting it.
+        
+        Nothing is captured unless capture_tracebacks is set or debug logging
+        is enabled. Source lines are not looked up here; formatting is left to
+        get_error_traceback, which is only called when someone wants to read it.
+        
+        Args:
+            error: Exception to capture
+            
+        Returns:
+            TracebackException for the error, or None if tracebacks are not captured
+        """
+        if not (self.capture_tracebacks or self.logger.isEnabledFor(logging.DEBUG)):
+            return None
+        return traceback.TracebackException.from_exception(error, lookup_lines=False)
     
     def clear_error_history(self) -> None:
         """Clear the error history."""
-        self.error_history = []
+        self.error_history.clear()
         self.logger.info("Error history cleared")
     
     def get_error_history(self) -> List[Dict[str, Any]]:
@@ -237,9 +320,24 @@ class ErrorManager:
         Get the error history.
         
         Returns:
-            List of error dictionaries
+            List of error dictionaries, oldest first
         """
-        return self.error_history
+        return list(self.error_history)
+    
+    def get_error_traceback(self, index: int = -1) -> Optional[str]:
+        """
+        Get the formatted traceback of an error in the history.
+        
+        Args:
+            index: Position in the error history (defaults to the most recent error)
+            
+        Returns:
+            Formatted traceback string, or None if the error has no traceback
+        """
+        tb = self.error_history[index].get("traceback")
+        if tb is None:
+            return None
+        return "".join(tb.format())
     
     def error_handler(self, func: Callable[..., T]) -> Callable[..., Union[T, Dict[str, Any]]]:
         """
@@ -251,34 +349,48 @@ class ErrorManager:
         Returns:
             Decorated function that handles errors
         """
+        # Decide once whether func is defined in a class ("Class.method"), rather
+        # than inspecting the call arguments every time an error is handled
+        qualname_parts = func.__qualname__.split(".")
+        is_method = len(qualname_parts) > 1 and qualname_parts[-2] != "<locals>"
+        func_name = func.__name__
+        
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            max_retries = self.max_retries
             retry_count = 0
+            deadline = time.monotonic() + RETRY_TIME_BUDGET_SECONDS
             
-            while retry_count <= self.max_retries:
+            while retry_count <= max_retries:
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    error_type = type(e).__name__
+                    error_type = self._classify_error(e)
                     
                     # Check if we should retry
                     if self.should_retry(error_type, retry_count):
-                        retry_count += 1
-                        self.logger.info(f"Retrying {func.__name__} after error: {error_type} (attempt {retry_count})")
-                        continue
+                        # Honour the server's retry_after when given, otherwise back off
+                        # exponentially with a little jitter
+                        delay = self._retry_after(e)
+                        if not delay:
+                            delay = min(2 ** retry_count, MAX_BACKOFF_SECONDS) + random.random() * 0.1
+                        
+                        # Only retry while the wait fits in the overall time budget
+                        if time.monotonic() + delay < deadline:
+                            retry_count += 1
+                            self.logger.info(f"Retrying {func_name} after error: {error_type} "
+                                             f"(attempt {retry_count}, waiting {delay:.1f}s)")
+                            time.sleep(delay)
+                            continue
                     
-                    # Handle the error
-                    if hasattr(args[0], '__name__') and args[0].__name__ == 'function_calling_assistant':
-                        # This is an assistant method
-                        return self.handle_tool_call_error(e, func.__name__, kwargs)
-                    else:
-                        # Generic error
-                        return self.handle_tool_call_error(e, func.__name__)
+                    # Handle the error; pass the call arguments along for methods
+                    return self.handle_tool_call_error(e, func_name, kwargs if is_method else None)
             
             # If we get here, we've exhausted retries
             return {
                 "status": "error",
-                "error": f"Maximum retries ({self.max_retries}) exceeded",
-                "function_name": func.__name__
+                "error": f"Maximum retries ({max_retries}) exceeded",
+                "function_name": func_name
             }
         
         return wrapper
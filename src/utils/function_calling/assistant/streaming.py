@@ -4,15 +4,90 @@ Streaming conversation handler for function calling assistant.
 This module extends the base assistant with streaming conversation capabilities
 for a more interactive user experience.
 """
-import json
+import asyncio
+import inspect
 import time
 import logging
-from typing import Dict, Any, List, Optional, Generator, Union, Callable
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Generator, AsyncGenerator, Union, Callable
 
+import orjson
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from openai.types.chat import ChatCompletionChunk, ChatCompletionMessageParam
 
-from src.utils.function_calling.assistant.base import BaseFunctionCallingAssistant
+from src.utils.function_calling.assistant.base import BaseFunctionCallingAssistant, MAX_TOOL_WORKERS
+from src.utils.function_calling.utils.serialization import json_dumps, to_json_content
+
+# HTTP settings for the streaming client. Each turn opens two streams (before and
+# after the tool calls), so a pooled HTTP/2 connection saves a handshake per stream
+STREAM_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+STREAM_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=8, max_connections=32)
+
+# Content deltas buffered between the final-response producer task and its consumer
+STREAM_QUEUE_MAXSIZE = 64
+_STREAM_END = object()
+
+# Tool result cache size and how long a cached result stays valid
+TOOL_CACHE_MAX_ENTRIES = 128
+TOOL_CACHE_TTL_SECONDS = 60
+
+# Content batching: each batch holds CONTENT_BATCH_GROWTH times more deltas than
+# the last, up to CONTENT_MAX_BATCH; a sentence boundary always flushes
+CONTENT_BATCH_GROWTH = 3.0
+CONTENT_MAX_BATCH = 50
+_SENTENCE_END = re.compile(r"[.!?\n]")
+
+
+class ContentBatcher:
+    """
+    Merges streamed content deltas into progressively larger batches.
+    
+    The first delta is released on its own so the time to first token is
+    unchanged; later batches grow geometrically, which cuts the number of
+    updates (and Streamlit redraws) for long responses.
+    """
+    
+    __slots__ = ("_parts", "_flush_at")
+    
+    def __init__(self):
+        self._parts = []
+        self._flush_at = 1
+    
+    def add(self, text: str) -> Optional[str]:
+        """
+        Add a content delta.
+        
+        Args:
+            text: Content delta from the stream
+            
+        Returns:
+            The merged batch if it is due for release, otherwise None
+        """
+        self._parts.append(text)
+        if len(self._parts) >= self._flush_at or _SENTENCE_END.search(text):
+            return self.flush()
+        return None
+    
+    def flush(self) -> Optional[str]:
+        """
+        Release any buffered content.
+        
+        Returns:
+            The merged batch, or None if nothing is buffered
+        """
+        if not self._parts:
+            return None
+        
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._flush_at = min(CONTENT_MAX_BATCH, math.ceil(self._flush_at * CONTENT_BATCH_GROWTH))
+        return text
 
 
 class StreamingConversationHandler:
@@ -39,6 +114,17 @@ class StreamingConversationHandler:
         self.assistant = assistant
         self.logger = logging.getLogger(self.__class__.__name__)
         
+        # Async client and event loop, created on first use. The client is bound
+        # to the loop it first runs on, so both are kept for the handler's lifetime
+        self._async_client = None
+        self._loop = None
+        
+        # (function name, canonical args) -> (timestamp, response), least recently used first
+        self._tool_cache = OrderedDict()
+        
+        # Function name -> (function, is_cacheable, is_async), see _resolve
+        self._resolved_functions = {}
+        
         # Initialize placeholders for streaming
         self.current_message_parts = []
         
@@ -46,7 +132,30 @@ class StreamingConversationHandler:
         self.tool_call_count = 0
         self.token_count = 0
     
-    def stream_chat_completion(self, messages: List[Dict[str, Any]]) -> Generator[ChatCompletionChunk, None, None]:
+    def _get_async_client(self) -> AsyncOpenAI:
+        """
+        Get the async OpenAI client, creating it from the assistant's client.
+        
+        Returns:
+            AsyncOpenAI client using the same API key as the assistant, over a
+            persistent HTTP/2 connection pool
+        """
+        if not self.assistant.client:
+            self.logger.error("LLM client not set up, call setup_llm first")
+            raise ValueError("LLM client not set up, call setup_llm first")
+        
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.assistant.client.api_key,
+                http_client=DefaultAsyncHttpxClient(
+                    http2=True,
+                    timeout=STREAM_HTTP_TIMEOUT,
+                    limits=STREAM_HTTP_LIMITS
+                )
+            )
+        return self._async_client
+    
+    async def stream_chat_completion(self, messages: List[Dict[str, Any]]) -> AsyncGenerator[ChatCompletionChunk, None]:
         """
         Stream a chat completion from the OpenAI API.
         
@@ -56,12 +165,10 @@ class StreamingConversationHandler:
         Yields:
             ChatCompletionChunk objects
         """
-        if not self.assistant.client:
-            self.logger.error("LLM client not set up, call setup_llm first")
-            raise ValueError("LLM client not set up, call setup_llm first")
+        client = self._get_async_client()
         
         # Call the API with streaming enabled
-        stream = self.assistant.client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model=self.assistant.model,
             messages=messages,
             tools=self.assistant.function_definitions,
@@ -70,15 +177,232 @@ class StreamingConversationHandler:
         )
         
         # Return the stream
-        for chunk in stream:
+        async for chunk in stream:
             yield chunk
     
-    def process_streamed_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> Generator[Dict[str, Any], None, None]:
+    @staticmethod
+    def _tool_cache_key(function_name: str, function_args: Dict[str, Any]) -> str:
+        """
+        Build the tool cache key for a function call.
+        
+        Args:
+            function_name: Name of the function
+            function_args: Parsed function arguments
+            
+        Returns:
+            Cache key string, independent of argument order
+        """
+        return function_name + ":" + orjson.dumps(function_args, option=orjson.OPT_SORT_KEYS).decode()
+    
+    def _get_cached_tool_result(self, key: str) -> Optional[Any]:
+        """
+        Look up a fresh tool result in the cache.
+        
+        Args:
+            key: Tool cache key
+            
+        Returns:
+            Cached function response, or None if missing or expired
+        """
+        entry = self._tool_cache.get(key)
+        if entry is None:
+            return None
+        
+        timestamp, response = entry
+        if time.time() - timestamp > TOOL_CACHE_TTL_SECONDS:
+            del self._tool_cache[key]
+            return None
+        
+        self._tool_cache.move_to_end(key)
+        return response
+    
+    def _cache_tool_result(self, key: str, response: Any) -> None:
+        """
+        Store a tool result, evicting the least recently used entry when full.
+        
+        Args:
+            key: Tool cache key
+            response: Function response
+        """
+        self._tool_cache[key] = (time.time(), response)
+        self._tool_cache.move_to_end(key)
+        if len(self._tool_cache) > TOOL_CACHE_MAX_ENTRIES:
+            self._tool_cache.popitem(last=False)
+    
+    def _resolve(self, function_name: str) -> Optional[tuple]:
+        """
+        Resolve a tool function name once per handler.
+        
+        Args:
+            function_name: Name of the function
+            
+        Returns:
+            Tuple of (function, is_cacheable, is_async), or None if the
+            assistant has no such function
+        """
+        resolved = self._resolved_functions.get(function_name)
+        if resolved is None:
+            function = self.assistant.available_functions.get(function_name)
+            if function is None:
+                return None
+            resolved = (
+                function,
+                function_name in self.assistant.cacheable_functions,
+                inspect.iscoroutinefunction(function)
+            )
+            self._resolved_functions[function_name] = resolved
+        return resolved
+    
+    async def _call_function(self, function_name: str,
+                             function: Callable[..., Any],
+                             function_args: Dict[str, Any],
+                             semaphore: asyncio.Semaphore,
+                             script_ctx: Any = None,
+                             is_async: bool = False) -> Dict[str, Any]:
+        """
+        Run one tool function, in a worker thread unless it is a coroutine function.
+        
+        Args:
+            function_name: Name of the function
+            function: Function to call
+            function_args: Parsed function arguments
+            semaphore: Semaphore bounding how many tool functions run at once
+            script_ctx: Streamlit script run context to attach to the worker thread
+            is_async: Whether function is a coroutine function
+            
+        Returns:
+            Dictionary with the function name, execution time and either the
+            function response or the exception raised
+        """
+        def run_call():
+            # Tools read st.session_state, so worker threads need the script run context
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+            return function(**function_args)
+        
+        async with semaphore:
+            start_time = time.time()
+            try:
+                if is_async:
+                    response = await function(**function_args)
+                else:
+                    response = await asyncio.to_thread(run_call)
+                error = None
+            except Exception as e:
+                response = None
+                error = e
+        
+        return {
+            "function_name": function_name,
+            "execution_time": time.time() - start_time,
+            "response": response,
+            "error": error
+        }
+    
+    def _start_tool_call(self, tool_call: Dict[str, Any],
+                         semaphore: asyncio.Semaphore,
+                         script_ctx: Any = None,
+                         function_args: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Resolve a tool call and start running it.
+        
+        The call is answered from the cache when possible; otherwise its
+        function is scheduled as a task and left running, so this can be used
+        while the rest of the response is still streaming in.
+        
+        Args:
+            tool_call: Tool call dictionary
+            semaphore: Semaphore bounding how many tool functions run at once
+            script_ctx: Streamlit script run context for the worker threads
+            function_args: Already parsed arguments, if the caller has them
+            
+        Returns:
+            Dictionary with the function name and one of "error", "response"
+            (a cached result) or "task", or None if the call was already processed
+        """
+        # Skip if already processed
+        tool_call_id = tool_call.get("id", "")
+        if tool_call_id in self.assistant.processed_tool_call_ids:
+            self.logger.debug(f"Skipping already processed tool call: {tool_call_id}")
+            return None
+        
+        # Mark as processed. The event loop only switches tasks at an await,
+        # so checking and marking here cannot interleave with another caller
+        self.assistant.processed_tool_call_ids.add(tool_call_id)
+        
+        # Get function details
+        function_name = tool_call.get("function", {}).get("name", "")
+        
+        # Update statistics
+        self.tool_call_count += 1
+        
+        error_message = None
+        try:
+            # Parse arguments
+            if function_args is None:
+                function_args = orjson.loads(tool_call.get("function", {}).get("arguments", "{}"))
+        except Exception as e:
+            error_message = str(e)
+        else:
+            # Check if function is available
+            resolved = self._resolve(function_name)
+            if resolved is None:
+                error_message = f"Function '{function_name}' not found"
+        
+        if error_message is not None:
+            return {"function_name": function_name, "error": error_message}
+        
+        function, is_cacheable, is_async = resolved
+        cache_key = None
+        
+        # Answer repeated read-only calls from the cache
+        if is_cacheable:
+            cache_key = self._tool_cache_key(function_name, function_args)
+            cached_response = self._get_cached_tool_result(cache_key)
+            if cached_response is not None:
+                self.logger.debug(f"Using cached result for function: {function_name}")
+                return {"function_name": function_name, "response": cached_response}
+        
+        # Call the function
+        self.logger.info(f"Calling function: {function_name} with args: {function_args}")
+        task = asyncio.create_task(self._call_function(
+            function_name, function, function_args, semaphore, script_ctx, is_async
+        ))
+        return {"function_name": function_name, "task": task, "cache_key": cache_key}
+    
+    def _cancel_started_tool_calls(self, started: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Abandon tool calls that were started but whose results will not be used.
+        
+        Running tasks are cancelled and the calls are unmarked as processed, so
+        a retried response can run them again.
+        
+        Args:
+            started: Results of _start_tool_call by tool call ID; emptied here
+        """
+        for tool_call_id, entry in started.items():
+            task = entry.get("task")
+            if task is not None and not task.done():
+                task.cancel()
+            self.assistant.processed_tool_call_ids.discard(tool_call_id)
+            self.logger.debug(f"Abandoned started tool call: {tool_call_id}")
+        started.clear()
+    
+    async def process_streamed_tool_calls(self, tool_calls: List[Dict[str, Any]],
+                                          started: Optional[Dict[str, Dict[str, Any]]] = None,
+                                          semaphore: Optional[asyncio.Semaphore] = None
+                                         ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Process tool calls with streaming updates.
         
+        The functions run concurrently in worker threads; completion updates
+        are yielded as each one finishes, while the tool messages are added to
+        the history in the original call order.
+        
         Args:
             tool_calls: List of tool call dictionaries
+            started: Results of _start_tool_call for calls already started
+                while the response was streaming, by tool call ID
+            semaphore: Semaphore the started calls were given
             
         Yields:
             Status updates during processing
@@ -86,48 +410,50 @@ class StreamingConversationHandler:
         if not tool_calls:
             return
         
-        for i, tool_call in enumerate(tool_calls):
-            # Skip if already processed
-            tool_call_id = tool_call.get("id", "")
-            if tool_call_id in self.assistant.processed_tool_call_ids:
-                self.logger.debug(f"Skipping already processed tool call: {tool_call_id}")
-                continue
-            
-            # Mark as processed
-            self.assistant.processed_tool_call_ids.add(tool_call_id)
-            
-            # Get function details
-            function_name = tool_call.get("function", {}).get("name", "")
-            function_args_str = tool_call.get("function", {}).get("arguments", "{}")
-            
-            # Update statistics
-            self.tool_call_count += 1
-            
-            # Yield status update - starting function call
-            yield {
-                "status": "calling_function",
-                "function_name": function_name,
-                "index": i,
-                "total": len(tool_calls)
-            }
-            
-            try:
-                # Parse arguments
-                function_args = json.loads(function_args_str)
+        started = started or {}
+        total = len(tool_calls)
+        tool_messages = {}
+        pending = {}
+        script_ctx = get_script_run_ctx()
+        
+        # Cap concurrent Asana calls, as BaseFunctionCallingAssistant does
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(MAX_TOOL_WORKERS)
+        
+        # Calls stay in started until they are in pending or answered. If the
+        # consumer stops early, calls still running are abandoned rather than
+        # left pending; the caller abandons whatever is left in started
+        try:
+            for i, tool_call in enumerate(tool_calls):
+                tool_call_id = tool_call.get("id", "")
+                entry = started.get(tool_call_id)
+                if entry is None:
+                    entry = self._start_tool_call(tool_call, semaphore, script_ctx)
+                    if entry is None:
+                        continue
+                function_name = entry["function_name"]
                 
-                # Check if function is available
-                if function_name not in self.assistant.available_functions:
-                    error_message = f"Function '{function_name}' not found"
-                    self.logger.error(error_message)
+                # Yield status update - starting function call
+                yield {
+                    "status": "calling_function",
+                    "function_name": function_name,
+                    "index": i,
+                    "total": total
+                }
+                
+                tool_messages[i] = {
+                    "tool_call_id": tool_call_id,
+                    "role": "tool",
+                    "name": function_name
+                }
+                started.pop(tool_call_id, None)
+                
+                if "error" in entry:
+                    error_message = entry["error"]
+                    self.logger.error(f"Error processing tool call: {error_message}")
                     
                     # Add error response to conversation history
-                    tool_response = {
-                        "tool_call_id": tool_call_id,
-                        "role": "tool",
-                        "name": function_name,
-                        "content": json.dumps({"error": error_message})
-                    }
-                    self.assistant.add_message_to_history(tool_response)
+                    tool_messages[i]["content"] = json_dumps({"error": error_message})
                     
                     # Yield status update - function error
                     yield {
@@ -135,181 +461,345 @@ class StreamingConversationHandler:
                         "function_name": function_name,
                         "error": error_message,
                         "index": i,
-                        "total": len(tool_calls)
+                        "total": total
                     }
-                    continue
-                
-                # Call the function
-                self.logger.info(f"Calling function: {function_name} with args: {function_args}")
-                
-                # Record start time
-                start_time = time.time()
-                
-                # Call the function
-                function_response = self.assistant.available_functions[function_name](**function_args)
-                
-                # Record end time
-                end_time = time.time()
-                execution_time = end_time - start_time
-                
-                # Add response to conversation history
-                tool_response = {
-                    "tool_call_id": tool_call_id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": json.dumps(function_response)
-                }
-                self.assistant.add_message_to_history(tool_response)
-                
-                # Yield status update - function complete
-                yield {
-                    "status": "function_complete",
-                    "function_name": function_name,
-                    "execution_time": execution_time,
-                    "success": True,
-                    "index": i,
-                    "total": len(tool_calls),
-                    "response": function_response
-                }
-            except Exception as e:
-                self.logger.error(f"Error processing tool call: {str(e)}")
-                
-                # Add error response to conversation history
-                tool_response = {
-                    "tool_call_id": tool_call_id,
-                    "role": "tool",
-                    "name": function_name,
-                    "content": json.dumps({"error": str(e)})
-                }
-                self.assistant.add_message_to_history(tool_response)
-                
-                # Yield status update - function error
-                yield {
-                    "status": "function_error",
-                    "function_name": function_name,
-                    "error": str(e),
-                    "index": i,
-                    "total": len(tool_calls)
-                }
+                elif "response" in entry:
+                    tool_messages[i]["content"] = to_json_content(entry["response"])
+                    
+                    # Yield status update - function complete
+                    yield {
+                        "status": "function_complete",
+                        "function_name": function_name,
+                        "execution_time": 0.0,
+                        "success": True,
+                        "cached": True,
+                        "index": i,
+                        "total": total,
+                        "response": entry["response"]
+                    }
+                else:
+                    pending[entry["task"]] = (i, entry["cache_key"])
+            
+            # Yield completion updates in the order the calls finish
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i, cache_key = pending.pop(task)
+                    result = task.result()
+                    function_name = result["function_name"]
+                    
+                    if result["error"] is None:
+                        tool_messages[i]["content"] = to_json_content(result["response"])
+                        # Asana tools report failures as {"status": "error"} results;
+                        # those are not cached so a retried call reaches Asana again
+                        response = result["response"]
+                        if cache_key is not None and not (isinstance(response, dict) and response.get("status") == "error"):
+                            self._cache_tool_result(cache_key, response)
+                        
+                        # Yield status update - function complete
+                        yield {
+                            "status": "function_complete",
+                            "function_name": function_name,
+                            "execution_time": result["execution_time"],
+                            "success": True,
+                            "index": i,
+                            "total": total,
+                            "response": result["response"]
+                        }
+                    else:
+                        error_message = str(result["error"])
+                        self.logger.error(f"Error processing tool call: {error_message}")
+                        tool_messages[i]["content"] = json_dumps({"error": error_message})
+                        
+                        # Yield status update - function error
+                        yield {
+                            "status": "function_error",
+                            "function_name": function_name,
+                            "error": error_message,
+                            "index": i,
+                            "total": total
+                        }
+        finally:
+            if pending:
+                self._cancel_started_tool_calls({
+                    tool_messages[i]["tool_call_id"]: {"task": task}
+                    for task, (i, _) in pending.items()
+                })
+        
+        # Add the responses to conversation history in call order
+        for i in sorted(tool_messages):
+            self.assistant.add_message_to_history(tool_messages[i])
     
-    def stream_response_with_tool_calls(self, 
-                                       prompt: str, 
-                                       stream_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
-                                      ) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+    async def _produce_content(self, messages: List[Dict[str, Any]], queue: asyncio.Queue) -> None:
         """
-        Stream a response with function calling.
+        Stream a chat completion into a queue of content deltas.
+        
+        The queue receives each non-empty content delta, then either _STREAM_END
+        or the exception that ended the stream.
+        
+        Args:
+            messages: List of message dictionaries
+            queue: Queue to put the content deltas on
+        """
+        try:
+            async for chunk in self.stream_chat_completion(messages):
+                content = chunk.choices[0].delta.content
+                if content:
+                    await queue.put(content)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_STREAM_END)
+    
+    @staticmethod
+    def _content_update(update_type: str, content: str, full_content: str,
+                        stream_callback: Optional[Callable[[str, Dict[str, Any]], None]]) -> Dict[str, Any]:
+        """
+        Report a batch of streamed content to the callback and build its update.
+        
+        Args:
+            update_type: "content" or "final_content"
+            content: Batch of new content
+            full_content: All content received so far
+            stream_callback: Callback function for streaming updates, if any
+            
+        Returns:
+            Content update dictionary
+        """
+        # Call the callback if provided
+        if stream_callback:
+            stream_callback(update_type, {
+                "content": content,
+                "full_content": full_content
+            })
+        
+        return {
+            "type": update_type,
+            "content": content,
+            "full_content": full_content
+        }
+    
+    @staticmethod
+    def _tool_call_update(tool_calls: List[Dict[str, Any]],
+                          stream_callback: Optional[Callable[[str, Dict[str, Any]], None]]) -> Dict[str, Any]:
+        """
+        Report the tool calls collected so far to the callback and build their update.
+        
+        Args:
+            tool_calls: Tool calls collected from the stream
+            stream_callback: Callback function for streaming updates, if any
+            
+        Returns:
+            Tool call update dictionary
+        """
+        # Call the callback if provided
+        if stream_callback:
+            stream_callback("tool_call", {
+                "tool_calls": tool_calls
+            })
+        
+        return {
+            "type": "tool_call",
+            "tool_calls": tool_calls
+        }
+    
+    def iter_response_with_tool_calls(self,
+                                      prompt: str,
+                                      stream_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
+                                     ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Synchronous wrapper around stream_response_with_tool_calls.
+        
+        Drives the async generator on the handler's event loop so it can be
+        consumed from regular (Streamlit) code.
         
         Args:
             prompt: User prompt
             stream_callback: Callback function for streaming updates
             
         Yields:
-            Status updates during processing
+            The same updates as stream_response_with_tool_calls
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        loop = self._loop
+        
+        updates = self.stream_response_with_tool_calls(prompt, stream_callback)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(updates.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(updates.aclose())
+    
+    async def stream_response_with_tool_calls(self, 
+                                             prompt: str, 
+                                             stream_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
+                                            ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream a response with function calling.
+        
+        Args:
+            prompt: User prompt
+            stream_callback: Callback function for streaming updates
             
-        Returns:
-            Final response dictionary
+        Yields:
+            Status updates during processing, ending with a "complete" update
+            whose "response" holds the final response dictionary
         """
         # Add user message to history
         user_message = {"role": "user", "content": prompt}
         self.assistant.add_message_to_history(user_message)
         
-        # Reset streaming state
+        # Reset streaming state. Content and tool call arguments are collected
+        # as lists of parts and joined only when the full text is needed
         self.current_message_parts = []
-        collected_message = ""
-        collected_tool_calls = []
+        message_parts = self.current_message_parts
+        # Tool calls and their argument parts by stream index; indices may
+        # arrive out of order or with gaps, so they are only sorted at the end
+        tool_calls_by_index = {}
+        argument_parts = {}
         current_tool_call = None
+        current_argument_parts = None
+        batcher = ContentBatcher()
         
-        # Get a streaming response
-        for chunk in self.stream_chat_completion(self.assistant.conversation_history):
-            delta = chunk.choices[0].delta
-            
-            # Handle content
-            if delta.content:
-                collected_message += delta.content
-                self.current_message_parts.append(delta.content)
-                
-                # Call the callback if provided
-                if stream_callback:
-                    stream_callback("content", {
-                        "content": delta.content,
-                        "full_content": collected_message
-                    })
+        # Tool calls whose arguments are complete are started while the rest
+        # of the response streams in, by tool call ID
+        started_tool_calls = {}
+        semaphore = asyncio.Semaphore(MAX_TOOL_WORKERS)
+        script_ctx = get_script_run_ctx()
+        
+        # Tool calls started early but not yet handed to process_streamed_tool_calls
+        # must not be left running if the stream fails or the consumer stops reading
+        try:
+            # Get a streaming response
+            async for chunk in self.stream_chat_completion(self.assistant.get_history_for_api()):
+                delta = chunk.choices[0].delta
                 
-                # Yield content update
-                yield {
-                    "type": "content",
-                    "content": delta.content,
-                    "full_content": collected_message
-                }
-            
-            # Handle tool calls
-            if delta.tool_calls:
-                for tc in delta.tool_calls:
-                    # Initialize new tool call if index is new
-                    if tc.index is not None:
-                        if len(collected_tool_calls) <= tc.index:
-                            collected_tool_calls.append({
-                                "id": "",
-                                "function": {"name": "", "arguments": ""}
-                            })
-                        current_tool_call = collected_tool_calls[tc.index]
-                    
-                    # Update ID
-                    if tc.id:
-                        current_tool_call["id"] = tc.id
+                # Handle content
+                if delta.content:
+                    message_parts.append(delta.content)
                     
-                    # Update function name
-                    if tc.function and tc.function.name:
-                        current_tool_call["function"]["name"] = tc.function.name
+                    # Yield content update once a batch is due
+                    batch = batcher.add(delta.content)
+                    if batch:
+                        yield self._content_update("content", batch, "".join(message_parts), stream_callback)
+                
+                # Handle tool calls
+                if delta.tool_calls:
+                    # Only report a tool call update when a call starts or gets its
+                    # ID or name, not for every argument fragment
+                    tool_calls_changed = False
                     
-                    # Update function arguments
-                    if tc.function and tc.function.arguments:
-                        current_tool_call["function"]["arguments"] += tc.function.arguments
+                    for tc in delta.tool_calls:
+                        # Initialize new tool call if index is new
+                        if tc.index is not None:
+                            current_tool_call = tool_calls_by_index.get(tc.index)
+                            if current_tool_call is None:
+                                current_tool_call = tool_calls_by_index[tc.index] = {
+                                    "id": "",
+                                    "function": {"name": "", "arguments": ""}
+                                }
+                                argument_parts[tc.index] = []
+                                tool_calls_changed = True
+                            current_argument_parts = argument_parts[tc.index]
+                        
+                        # Update ID
+                        if tc.id and tc.id != current_tool_call["id"]:
+                            current_tool_call["id"] = tc.id
+                            tool_calls_changed = True
+                        
+                        # Update function name
+                        if tc.function and tc.function.name and tc.function.name != current_tool_call["function"]["name"]:
+                            current_tool_call["function"]["name"] = tc.function.name
+                            tool_calls_changed = True
+                        
+                        # Update function arguments
+                        if tc.function and tc.function.arguments:
+                            current_argument_parts.append(tc.function.arguments)
+                            
+                            # Start the call as soon as its arguments parse. Parsing is
+                            # only attempted when a fragment could close the JSON object
+                            if (current_tool_call["id"] and current_tool_call["function"]["name"]
+                                    and current_tool_call["id"] not in started_tool_calls
+                                    and tc.function.arguments.rstrip().endswith("}")):
+                                try:
+                                    function_args = orjson.loads("".join(current_argument_parts))
+                                except orjson.JSONDecodeError:
+                                    pass
+                                else:
+                                    entry = self._start_tool_call(
+                                        current_tool_call, semaphore, script_ctx, function_args
+                                    )
+                                    if entry is not None:
+                                        started_tool_calls[current_tool_call["id"]] = entry
                     
+                    if tool_calls_changed:
+                        # Report a shallow snapshot of the IDs and names; the arguments
+                        # are only complete, and only reported, once the stream ends
+                        yield self._tool_call_update(
+                            [
+                                {"id": entry["id"], "function": {"name": entry["function"]["name"]}}
+                                for entry in (tool_calls_by_index[i] for i in sorted(tool_calls_by_index))
+                            ],
+                            stream_callback
+                        )
+            
+            # Release any content still buffered
+            collected_message = "".join(message_parts)
+            batch = batcher.flush()
+            if batch:
+                yield self._content_update("content", batch, collected_message, stream_callback)
+            
+            # Materialize the streamed arguments of each tool call and report the
+            # completed calls once
+            collected_tool_calls = []
+            for i in sorted(tool_calls_by_index):
+                tool_call = tool_calls_by_index[i]
+                tool_call["function"]["arguments"] = "".join(argument_parts[i])
+                collected_tool_calls.append(tool_call)
+            if collected_tool_calls:
+                yield self._tool_call_update(collected_tool_calls, stream_callback)
+            
+            # Final message with all content and tool calls
+            full_message = {
+                "role": "assistant",
+                "content": collected_message or "",  # Ensure we never have None for content
+            }
+            
+            if collected_tool_calls:
+                full_message["tool_calls"] = collected_tool_calls
+            
+            # Add assistant message to history
+            self.assistant.add_message_to_history(full_message)
+            
+            # If there are tool calls, process them
+            if collected_tool_calls:
+                # Yield processing status
+                yield {
+                    "type": "processing_tools",
+                    "tool_count": len(collected_tool_calls)
+                }
+                
+                # Process tool calls with streaming updates
+                async for update in self.process_streamed_tool_calls(
+                    collected_tool_calls, started_tool_calls, semaphore
+                ):
                     # Call the callback if provided
                     if stream_callback:
-                        stream_callback("tool_call", {
-                            "tool_calls": collected_tool_calls
-                        })
+                        stream_callback("tool_processing", update)
                     
-                    # Yield tool call update
+                    # Yield tool processing update
                     yield {
-                        "type": "tool_call",
-                        "tool_calls": collected_tool_calls
+                        "type": "tool_processing",
+                        **update
                     }
-        
-        # Final message with all content and tool calls
-        full_message = {
-            "role": "assistant",
-            "content": collected_message or "",  # Ensure we never have None for content
-        }
+        finally:
+            self._cancel_started_tool_calls(started_tool_calls)
         
         if collected_tool_calls:
-            full_message["tool_calls"] = collected_tool_calls
-        
-        # Add assistant message to history
-        self.assistant.add_message_to_history(full_message)
-        
-        # If there are tool calls, process them
-        if collected_tool_calls:
-            # Yield processing status
-            yield {
-                "type": "processing_tools",
-                "tool_count": len(collected_tool_calls)
-            }
-            
-            # Process tool calls with streaming updates
-            for update in self.process_streamed_tool_calls(collected_tool_calls):
-                # Call the callback if provided
-                if stream_callback:
-                    stream_callback("tool_processing", update)
-                
-                # Yield tool processing update
-                yield {
-                    "type": "tool_processing",
-                    **update
-                }
-            
             # Get final response with tool results
             yield {
                 "type": "thinking",
@@ -318,27 +808,37 @@ class StreamingConversationHandler:
             
             # Stream final response
             final_collected_message = ""
+            final_parts = []
+            final_batcher = ContentBatcher()
             
             try:
-                for chunk in self.stream_chat_completion(self.assistant.conversation_history):
-                    delta = chunk.choices[0].delta
-                    
-                    if delta.content:
-                        final_collected_message += delta.content
+                # Read the stream in its own task so a slow consumer does not hold
+                # up the network reads; the queue bounds how far it can run ahead
+                queue = asyncio.Queue(maxsize=STREAM_QUEUE_MAXSIZE)
+                producer = asyncio.create_task(
+                    self._produce_content(self.assistant.get_history_for_api(), queue)
+                )
+                try:
+                    while True:
+                        content = await queue.get()
+                        if content is _STREAM_END:
+                            break
+                        if isinstance(content, Exception):
+                            raise content
                         
-                        # Call the callback if provided
-                        if stream_callback:
-                            stream_callback("final_content", {
-                                "content": delta.content,
-                                "full_content": final_collected_message
-                            })
+                        final_parts.append(content)
                         
-                        # Yield content update
-                        yield {
-                            "type": "final_content",
-                            "content": delta.content,
-                            "full_content": final_collected_message
-                        }
+                        # Yield content update once a batch is due
+                        batch = final_batcher.add(content)
+                        if batch:
+                            yield self._content_update("final_content", batch, "".join(final_parts), stream_callback)
+                finally:
+                    producer.cancel()
+                
+                final_collected_message = "".join(final_parts)
+                batch = final_batcher.flush()
+                if batch:
+                    yield self._content_update("final_content", batch, final_collected_message, stream_callback)
                 
                 # Add final assistant message to history
                 self.assistant.add_message_to_history({
@@ -356,19 +856,25 @@ class StreamingConversationHandler:
                 })
             
             # Return final response
-            return {
-                "role": "assistant",
-                "content": final_collected_message,
-                "has_tool_calls": True,
-                "tool_calls_count": len(collected_tool_calls),
-                "tool_call_count": self.tool_call_count
+            yield {
+                "type": "complete",
+                "response": {
+                    "role": "assistant",
+                    "content": final_collected_message,
+                    "has_tool_calls": True,
+                    "tool_calls_count": len(collected_tool_calls),
+                    "tool_call_count": self.tool_call_count
+                }
             }
         else:
             # No tool calls, just return the message
-            return {
-                "role": "assistant",
-                "content": collected_message or "",  # Ensure we never have None
-                "has_tool_calls": False,
-                "tool_calls_count": 0,
-                "tool_call_count": 0
+            yield {
+                "type": "complete",
+                "response": {
+                    "role": "assistant",
+                    "content": collected_message or "",  # Ensure we never have None
+                    "has_tool_calls": False,
+                    "tool_calls_count": 0,
+                    "tool_call_count": 0
+                }
             }
@@ -4,23 +4,53 @@ Visualization module for function calling assistant.
 This module provides functionality for creating and rendering visualizations
 from Asana data, including charts, timelines, and other visual representations.
 """
+import hashlib
 import logging
-import json
-from typing import Dict, Any, List, Optional, Union
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Union
 
+import orjson
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
 from plotly.subplots import make_subplots
 
 from src.utils.function_calling.tools.helpers import (
     # create_chart, # Deprecated: Specific helpers are called directly now
     convert_to_chart_data,
+    create_line_chart,
+    create_pie_chart,
+    create_timeline_chart,
     # fig_to_json # Deprecated: Use plotly.io.to_json directly where needed
 )
 from src.utils.function_calling.schemas import ChartType
 
+# Number of rendered figures kept for repeated (function name, result) pairs
+VIZ_CACHE_MAX_ENTRIES = 32
+
+_ORJSON_HASH_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def summarize_chart_data(data: Union[List[Any], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Describe chart input data without keeping a reference to it.
+
+    Args:
+        data: Data a chart was rendered from
+
+    Returns:
+        Dictionary with the number of items and a short hash of the data
+        (None if the data cannot be encoded as JSON)
+    """
+    try:
+        data_hash = hashlib.blake2b(orjson.dumps(data, option=_ORJSON_HASH_OPTIONS), digest_size=8).hexdigest()
+    except TypeError:
+        data_hash = None
+    return {"n_items": len(data), "data_hash": data_hash}
+
 
 class VisualizationManager:
     """
@@ -35,20 +65,29 @@ class VisualizationManager:
         """Initialize the visualization manager."""
         self.logger = logging.getLogger(self.__class__.__name__)
 
-        # Track created visualizations
+        # Track created visualizations (type, config and a summary of the data,
+        # not the data itself, so long sessions do not hold on to every result)
         self.visualizations = []
 
-    def render_chart_from_json(self, chart_json: Dict[str, Any]) -> go.Figure:
+        # Digest of (function name, result) -> rendered figure, least recently used first
+        self._viz_cache = OrderedDict()
+
+    def render_chart_from_json(self, chart_json: Union[Dict[str, Any], str, bytes]) -> go.Figure:
         """
         Render a chart from a JSON representation.
 
         Args:
-            chart_json: JSON representation of a Plotly figure
+            chart_json: JSON representation of a Plotly figure, either as a
+                dictionary or as the serialized JSON string
 
         Returns:
             Plotly figure object
         """
         try:
+            # Serialized JSON goes straight to Plotly's decoder, skipping a separate parse
+            if isinstance(chart_json, (str, bytes)):
+                return pio.from_json(chart_json)
+
             # Create figure from JSON
             fig = go.Figure(chart_json)
             return fig
@@ -103,33 +142,26 @@ class VisualizationManager:
         Returns:
             Plotly figure object
         """
-        # Extract project data
-        tasks = []
-        start_dates = []
-        end_dates = []
-        statuses = []
-
-        for project in projects:
-            name = project.get("name", "Unnamed Project")
-            start_on = project.get("start_on")
-            due_on = project.get("due_on")
-            completed = project.get("completed", False)
-
-            # Skip projects without dates
-            if not start_on or not due_on:
-                continue
-
-            tasks.append(name)
-            start_dates.append(start_on)
-            end_dates.append(due_on)
-            statuses.append("Completed" if completed else "In Progress")
+        # Extract project data, one column per field
+        df = pd.DataFrame.from_records(projects).reindex(
+            columns=["name", "start_on", "due_on", "completed"]
+        )
+
+        # Skip projects without dates
+        has_dates = (
+            df["start_on"].notna() & df["start_on"].astype(bool) &
+            df["due_on"].notna() & df["due_on"].astype(bool)
+        )
+        df = df[has_dates]
 
         # Create timeline data
         timeline_data = {
-            "tasks": tasks,
-            "start_dates": start_dates,
-            "end_dates": end_dates,
-            "group": statuses
+            "tasks": df["name"].fillna("Unnamed Project").tolist(),
+            "start_dates": df["start_on"].tolist(),
+            "end_dates": df["due_on"].tolist(),
+            "group": np.where(
+                df["completed"].notna() & df["completed"].astype(bool), "Completed", "In Progress"
+            ).tolist()
         }
 
         # Create config
@@ -140,11 +172,7 @@ class VisualizationManager:
 
         # Create chart - Using direct helper call (assuming it exists and takes flat kwargs)
         try:
-            from .helpers import create_timeline_chart # Local import if needed
             fig = create_timeline_chart(**timeline_data, **config) # Pass flat kwargs
-        except ImportError:
-             self.logger.error("create_timeline_chart helper not found.")
-             fig = go.Figure()
         except Exception as e:
              self.logger.error(f"Error rendering project timeline: {e}")
              fig = go.Figure()
@@ -152,7 +180,7 @@ class VisualizationManager:
         # Track created visualization
         self.visualizations.append({
             "type": "timeline",
-            "data": projects, # Store original data
+            **summarize_chart_data(projects),
             "config": config
         })
 
@@ -169,15 +197,13 @@ class VisualizationManager:
         Returns:
             Plotly figure object
         """
-        # Extract data
-        names = []
-        completed = []
-        incomplete = []
-
-        for assignee in assignees:
-            names.append(assignee.get("assignee_name", "Unassigned"))
-            completed.append(assignee.get("completed_tasks", 0))
-            incomplete.append(assignee.get("incomplete_tasks", 0))
+        # Extract data, one column per field
+        df = pd.DataFrame.from_records(assignees).reindex(
+            columns=["assignee_name", "completed_tasks", "incomplete_tasks"]
+        )
+        names = df["assignee_name"].fillna("Unassigned").tolist()
+        completed = df["completed_tasks"].fillna(0).astype(int).tolist()
+        incomplete = df["incomplete_tasks"].fillna(0).astype(int).tolist()
 
         # Create config
         config = {
@@ -216,7 +242,7 @@ class VisualizationManager:
         # Track created visualization
         self.visualizations.append({
             "type": "task_distribution",
-            "data": assignees,
+            **summarize_chart_data(assignees),
             "config": config
         })
 
@@ -254,11 +280,7 @@ class VisualizationManager:
 
         # Create chart - Using direct helper call
         try:
-            from .helpers import create_line_chart # Local import if needed
             fig = create_line_chart(**line_data, **config) # Pass flat kwargs
-        except ImportError:
-             self.logger.error("create_line_chart helper not found.")
-             fig = go.Figure()
         except Exception as e:
              self.logger.error(f"Error rendering completion trend: {e}")
              fig = go.Figure()
@@ -266,7 +288,7 @@ class VisualizationManager:
         # Track created visualization
         self.visualizations.append({
             "type": "line",
-            "data": {"dates": dates, "completed": completed_counts, "created": created_counts},
+            **summarize_chart_data({"dates": dates, "completed": completed_counts, "created": created_counts}),
             "config": config
         })
 
@@ -303,11 +325,7 @@ class VisualizationManager:
 
         # Create chart - Using direct helper call
         try:
-            from .helpers import create_pie_chart # Local import if needed
             fig = create_pie_chart(**pie_data, **config) # Pass flat kwargs
-        except ImportError:
-             self.logger.error("create_pie_chart helper not found.")
-             fig = go.Figure()
         except Exception as e:
              self.logger.error(f"Error rendering progress chart: {e}")
              fig = go.Figure()
@@ -315,7 +333,7 @@ class VisualizationManager:
         # Track created visualization
         self.visualizations.append({
             "type": "pie",
-            "data": {"completed": completed, "total": total},
+            **summarize_chart_data({"completed": completed, "total": total}),
             "config": config
         })
 
@@ -326,7 +344,10 @@ class VisualizationManager:
                                        function_result: Dict[str, Any]) -> Optional[go.Figure]:
         """
         Detect and render an appropriate visualization based on function call.
-        NOTE: This might need further refactoring if create_chart_from_data is fully removed.
+
+        Streamlit reruns call this with the same results over and over, so
+        rendered figures are cached on a digest of the function name and
+        result. The cached figure object is shared; callers must not modify it.
 
         Args:
             function_name: Name of the function called
@@ -336,56 +357,133 @@ class VisualizationManager:
         Returns:
             Plotly figure object or None if no visualization is appropriate
         """
+        # Most function results have no chart; skip hashing them
+        if function_name not in _DISPATCH:
+            return None
+
         try:
-            # Check if result is a chart already (e.g., from create_direct_chart)
-            # This path might be less common now if create_direct_chart stores JSON in memory
-            if function_name == "create_direct_chart":
-                # Assuming create_direct_chart returns JSON in its result now (needs verification)
-                if function_result.get("status") == "success" and "chart_json" in function_result:
-                     try:
-                         return self.render_chart_from_json(json.loads(function_result["chart_json"]))
-                     except json.JSONDecodeError:
-                         self.logger.error("Failed to decode chart JSON from create_direct_chart result.")
-                         return None
-                # If create_direct_chart stores in memory, this path might not be hit.
-                # The UI component function_chat.py handles memory retrieval.
-                self.logger.debug("create_direct_chart called, but no chart_json found in result. Chart likely stored in memory.")
-                return None
-
-            # Check for project-related visualizations
-            if function_name == "get_portfolio_projects":
-                projects = function_result.get("projects", [])
-                if projects:
-                    return self.render_project_timeline(projects)
-
-            # Check for task distribution visualizations
-            if function_name == "get_task_distribution_by_assignee":
-                assignees = function_result.get("assignees", [])
-                if assignees:
-                    return self.render_task_distribution(assignees)
-
-            # Check for completion trend visualizations
-            if function_name == "get_task_completion_trend":
-                dates = function_result.get("dates", [])
-                completed_counts = function_result.get("completed_counts", [])
-                created_counts = function_result.get("created_counts", [])
-
-                if dates and (completed_counts or created_counts): # Check if at least one count list exists
-                    # Ensure lists have same length as dates, padding with 0 if necessary
-                    len_dates = len(dates)
-                    completed_counts = (completed_counts + [0] * len_dates)[:len_dates] if completed_counts else [0] * len_dates
-                    created_counts = (created_counts + [0] * len_dates)[:len_dates] if created_counts else [0] * len_dates
-                    return self.render_completion_trend(dates, completed_counts, created_counts)
-
-            # Check for project progress visualizations
-            if function_name == "get_project_progress":
-                completed = function_result.get("completed_tasks", 0)
-                total = function_result.get("total_tasks", 0)
-
-                if total > 0:
-                    return self.render_progress_chart(completed, total)
+            cache_key = hashlib.blake2b(
+                orjson.dumps((function_name, function_result), option=_ORJSON_HASH_OPTIONS),
+                digest_size=16
+            ).digest()
+        except TypeError:
+            # Result holds values orjson cannot encode; render without caching
+            cache_key = None
+
+        if cache_key is not None:
+            fig = self._viz_cache.get(cache_key)
+            if fig is not None:
+                self._viz_cache.move_to_end(cache_key)
+                return fig
+
+        fig = self._render_visualization(function_name, function_result)
+
+        if fig is not None and cache_key is not None:
+            self._viz_cache[cache_key] = fig
+            if len(self._viz_cache) > VIZ_CACHE_MAX_ENTRIES:
+                self._viz_cache.popitem(last=False)
+
+        return fig
 
+    def _render_visualization(self, function_name: str,
+                              function_result: Dict[str, Any]) -> Optional[go.Figure]:
+        """
+        Render the visualization for a function result, without caching.
+        NOTE: This might need further refactoring if create_chart_from_data is fully removed.
+
+        Args:
+            function_name: Name of the function called
+            function_result: Result of the function call
+
+        Returns:
+            Plotly figure object or None if no visualization is appropriate
+        """
+        adapter = _DISPATCH.get(function_name)
+        if adapter is None:
             return None
+
+        try:
+            return adapter(self, function_result)
         except Exception as e:
             self.logger.error(f"Error detecting/rendering visualization: {str(e)}", exc_info=True)
             return None
+
+
+# --- Render adapters for detect_and_render_visualization ---
+# Each adapter unpacks one function's result and renders it, or returns None
+# when the result holds nothing to chart.
+
+def _adapt_direct_chart(manager: VisualizationManager,
+                        result: Dict[str, Any]) -> Optional[go.Figure]:
+    """Render the chart JSON returned by create_direct_chart."""
+    if result.get("status") == "success" and "chart_json" in result:
+        # Invalid JSON is logged and rendered as an empty figure
+        return manager.render_chart_from_json(result["chart_json"])
+    # If create_direct_chart stores in memory, this path might not be hit.
+    # The UI component function_chat.py handles memory retrieval.
+    manager.logger.debug("create_direct_chart called, but no chart_json found in result. Chart likely stored in memory.")
+    return None
+
+
+def _adapt_portfolio_projects(manager: VisualizationManager,
+                              result: Dict[str, Any]) -> Optional[go.Figure]:
+    """Render a project timeline for get_portfolio_projects."""
+    projects = result.get("projects", [])
+    if projects:
+        return manager.render_project_timeline(projects)
+    return None
+
+
+def _adapt_task_distribution(manager: VisualizationManager,
+                             result: Dict[str, Any]) -> Optional[go.Figure]:
+    """Render the task distribution for get_task_distribution_by_assignee."""
+    assignees = result.get("assignees", [])
+    if assignees:
+        return manager.render_task_distribution(assignees)
+    return None
+
+
+def _zero_padded(counts: List[int], length: int) -> List[int]:
+    """Fit counts to length, truncating or padding the end with zeros."""
+    padded = np.zeros(length, dtype=np.int64)
+    counts = counts[:length]
+    padded[:len(counts)] = counts
+    # The chart models validate plain lists of ints
+    return padded.tolist()
+
+
+def _adapt_completion_trend(manager: VisualizationManager,
+                            result: Dict[str, Any]) -> Optional[go.Figure]:
+    """Render the completion trend for get_task_completion_trend."""
+    dates = result.get("dates", [])
+    completed_counts = result.get("completed_counts", [])
+    created_counts = result.get("created_counts", [])
+
+    if dates and (completed_counts or created_counts): # Check if at least one count list exists
+        # Ensure lists have same length as dates, padding with 0 if necessary
+        len_dates = len(dates)
+        completed_counts = _zero_padded(completed_counts, len_dates)
+        created_counts = _zero_padded(created_counts, len_dates)
+        return manager.render_completion_trend(dates, completed_counts, created_counts)
+    return None
+
+
+def _adapt_project_progress(manager: VisualizationManager,
+                            result: Dict[str, Any]) -> Optional[go.Figure]:
+    """Render a progress chart for get_project_progress."""
+    completed = result.get("completed_tasks", 0)
+    total = result.get("total_tasks", 0)
+
+    if total > 0:
+        return manager.render_progress_chart(completed, total)
+    return None
+
+
+# Function name -> render adapter
+_DISPATCH: Dict[str, Callable[[VisualizationManager, Dict[str, Any]], Optional[go.Figure]]] = {
+    "create_direct_chart": _adapt_direct_chart,
+    "get_portfolio_projects": _adapt_portfolio_projects,
+    "get_task_distribution_by_assignee": _adapt_task_distribution,
+    "get_task_completion_trend": _adapt_completion_trend,
+    "get_project_progress": _adapt_project_progress,
+}
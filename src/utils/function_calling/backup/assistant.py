@@ -4,21 +4,29 @@ Function calling assistant for the Asana Chat Assistant.
 This module provides the FunctionCallingAssistant class that handles calling the OpenAI API
 with function calling capability, managing the conversation, and processing the results.
 """
+import functools
 import logging
-import json
+import re
+import threading
 import time
-from typing import Dict, Any, List, Optional, Callable, Generator, Tuple
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Generator, Tuple
 
+import orjson
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import plotly.graph_objects as go
 import plotly.express as px
+import numpy as np
 import pandas as pd
 from openai import OpenAI
-from openai.types.chat import ChatCompletion, ChatCompletionMessage
-from plotly.subplots import make_subplots
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 
 from src.utils.function_calling.tools import AsanaToolSet
+from src.utils.function_calling.utils import json_dumps
+from src.utils.function_calling.assistant.base import RecentIdSet
 from src.utils.visualizations import (
     create_interactive_timeline, create_velocity_chart, create_burndown_chart,
     create_resource_allocation_chart, create_task_status_distribution, create_project_progress_bars
@@ -36,6 +44,549 @@ VISUALIZATION_FUNCTIONS = {
     "project_progress": create_project_progress_bars
 }
 
+# Default layout for generated figures, validated once; each figure only sets its title text
+_BASE_LAYOUT = go.Layout(
+    title={
+        'font': {'size': 20, 'color': '#333333', 'family': 'Arial, sans-serif'},
+        'y': 0.95,
+        'x': 0.5,
+        'xanchor': 'center',
+        'yanchor': 'top'
+    },
+    plot_bgcolor='rgba(245,245,245,0.8)',
+    paper_bgcolor='rgba(245,245,245,0.8)',
+    font=dict(family='Arial, sans-serif', color='#333333'),
+    margin=dict(l=40, r=40, t=80, b=40),
+    autosize=True,
+    height=450,
+    hoverlabel=dict(
+        bgcolor="white",
+        font_size=12,
+        font_family="Arial, sans-serif"
+    ),
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=-0.15,
+        xanchor="center",
+        x=0.5
+    )
+)
+
+def _build_color_map() -> Dict[str, list]:
+    """
+    Collect Plotly's named color sequences into one lookup table.
+    
+    Sequential scales take precedence over qualitative ones with the same name.
+    
+    Returns:
+        Dictionary mapping color scheme names to lists of colors
+    """
+    color_map = {}
+    for module in (px.colors.qualitative, px.colors.sequential):
+        for name in dir(module):
+            colors = getattr(module, name)
+            if not name.startswith("_") and isinstance(colors, list):
+                color_map[name] = colors
+    return color_map
+
+
+# Named Plotly color schemes available to generic charts
+_COLOR_SCHEMES = _build_color_map()
+
+# Fallback palette for generic charts and the palette for task status pies
+_DEFAULT_COLORS = px.colors.qualitative.Plotly
+_STATUS_COLORS = px.colors.qualitative.Set3
+
+def _build_bar_chart(fig: go.Figure, data: Dict[str, Any], config: Dict[str, Any], colors: Optional[list]) -> None:
+    """Add a bar trace to a generic chart, horizontal when config orientation is "h"."""
+    x_data = data.get("x_data", [])
+    y_data = data.get("y_data", [])
+    
+    # Handle orientation
+    orientation = config.get("orientation", "v")
+    
+    if orientation == "h":
+        fig.add_trace(go.Bar(
+            y=x_data,  # For horizontal, x and y are swapped
+            x=y_data,
+            orientation='h',
+            marker_color=colors[0] if colors else None
+        ))
+        # For horizontal bar charts, often you want the highest values at the top
+        fig.update_layout(yaxis=dict(autorange="reversed"))
+    else:
+        fig.add_trace(go.Bar(
+            x=x_data,
+            y=y_data,
+            marker_color=colors[0] if colors else None
+        ))
+
+
+def _build_line_chart(fig: go.Figure, data: Dict[str, Any], config: Dict[str, Any], colors: Optional[list]) -> None:
+    """Add a line trace with markers to a generic chart."""
+    fig.add_trace(go.Scatter(
+        x=data.get("x_data", []),
+        y=data.get("y_data", []),
+        mode='lines+markers',
+        line=dict(color=colors[0] if colors else None, width=3),
+        marker=dict(size=8)
+    ))
+
+
+def _build_pie_chart(fig: go.Figure, data: Dict[str, Any], config: Dict[str, Any], colors: Optional[list]) -> None:
+    """Add a pie (donut by default) trace to a generic chart."""
+    fig.add_trace(go.Pie(
+        labels=data.get("names", []),
+        values=data.get("values", []),
+        hole=config.get("hole", 0.4),
+        textinfo=config.get("textinfo", "percent+label"),
+        textposition=config.get("textposition", "inside"),
+        marker=dict(colors=colors)
+    ))
+
+
+def _build_scatter_chart(fig: go.Figure, data: Dict[str, Any], config: Dict[str, Any], colors: Optional[list]) -> None:
+    """Add a marker-only scatter trace to a generic chart."""
+    fig.add_trace(go.Scatter(
+        x=data.get("x_data", []),
+        y=data.get("y_data", []),
+        mode='markers',
+        marker=dict(
+            size=config.get("marker_size", 10),
+            color=colors[0] if colors else None
+        )
+    ))
+
+
+def _build_area_chart(fig: go.Figure, data: Dict[str, Any], config: Dict[str, Any], colors: Optional[list]) -> None:
+    """Add a line trace filled down to zero to a generic chart."""
+    fig.add_trace(go.Scatter(
+        x=data.get("x_data", []),
+        y=data.get("y_data", []),
+        mode='lines',
+        fill='tozeroy',
+        line=dict(color=colors[0] if colors else None, width=2),
+    ))
+
+
+# Trace builders for generic charts, by chart type
+_CHART_BUILDERS = {
+    "bar": _build_bar_chart,
+    "line": _build_line_chart,
+    "pie": _build_pie_chart,
+    "scatter": _build_scatter_chart,
+    "area": _build_area_chart,
+}
+
+# Columns read by create_interactive_timeline from each project estimate
+TIMELINE_COLUMNS = ["project", "estimated_completion_date", "project_due_date", "remaining_tasks", "days_difference"]
+
+# Columns read by create_velocity_chart and create_burndown_chart from each task
+TASK_TREND_COLUMNS = ["project", "status", "created_at", "completed_at"]
+
+# Upper bound on tool functions executed concurrently for one LLM response
+MAX_TOOL_WORKERS = 8
+
+# Deprecated visualization tools that the function calling loops intercept instead of calling
+INTERCEPTED_FUNCTIONS = frozenset({"create_visualization", "create_chart"})
+
+# Read-only tools whose results may be reused for identical calls within a short window
+CACHEABLE_FUNCTIONS = frozenset({
+    "get_portfolio_projects",
+    "get_project_details",
+    "get_project_tasks",
+    "get_task_details",
+    "search_tasks",
+    "get_tasks_by_assignee",
+    "get_projects_by_owner",
+    "get_project_gid_by_name",
+    "get_project_info_by_name",
+    "get_task_distribution_by_assignee",
+    "get_task_completion_trend",
+})
+
+# Phrases in a response that indicate the assistant is asking the user for a GID
+GID_REQUEST_PHRASES = (
+    "provide the gid",
+    "please provide the gid",
+    "provide the portfolio gid",
+    "provide me with the gid",
+    "provide me with the portfolio gid",
+    "provide the project gid",
+    "enter the gid",
+    "specify the gid",
+    "what is the gid",
+    "what's the gid",
+    "need the gid",
+    "please specify the gid",
+    "please enter the gid",
+    "send the gid",
+    "input the gid",
+    "add the gid",
+    "portfolio you are interested in",
+    "which portfolio",
+    "provide the portfolio",
+    "provide the id",
+    "provide the portfolio id",
+    "specify the portfolio",
+    "which portfolio gid",
+    "please provide",
+    "gid of the portfolio",
+    "id of the portfolio",
+    "portfolio id",
+    "provide me with",
+    "please give me",
+    "please provide me with"
+)
+
+# Phrases that, in the first interaction, suggest the assistant is asking which portfolio to use
+FIRST_INTERACTION_PHRASES = (
+    "which portfolio",
+    "portfolio are you",
+    "portfolio would you",
+    "portfolio do you",
+    "portfolio should",
+    "please provide",
+    "could you provide",
+    "can you provide",
+    "need to know which",
+    "need to know what",
+    "i'll need"
+)
+
+# Every phrase in both lists contains one of these words, so text without any of them cannot match
+GID_PRESCREEN_WORDS = ("gid", "portfolio", "provide", "give", "need")
+
+# Each phrase list compiled into one alternation, so the text is scanned once per list
+_GID_REQUEST_PATTERN = re.compile("|".join(map(re.escape, GID_REQUEST_PHRASES)))
+_FIRST_INTERACTION_PATTERN = re.compile("|".join(map(re.escape, FIRST_INTERACTION_PHRASES)))
+
+# Maximum number of messages kept after the leading system prompt
+MAX_HISTORY_MESSAGES = 24
+
+# Tool result cache limits
+TOOL_CACHE_MAX_ENTRIES = 256
+TOOL_CACHE_TTL_SECONDS = 120
+
+# Function specifications offered to the model; shared by every assistant instance
+FUNCTION_SPECS = (
+    {
+        "name": "get_portfolio_projects",
+        "description": "Get all projects in a portfolio",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "portfolio_gid": {
+                    "type": "string",
+                    "description": "The GID of the portfolio (optional, will use configured value if not provided)"
+                }
+            }
+        }
+    },
+    {
+        "name": "get_project_details",
+        "description": "Get detailed information about a specific project",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "project_gid": {
+                    "type": "string",
+                    "description": "The GID of the project"
+                }
+            },
+            "required": ["project_gid"]
+        }
+    },
+    {
+        "name": "get_project_tasks",
+        "description": "Get tasks for a specific project",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "project_gid": {
+                    "type": "string",
+                    "description": "The GID of the project"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of tasks to return",
+                    "default": 50
+                },
+                "completed": {
+                    "type": "boolean",
+                    "description": "Filter for completed tasks (null for all tasks)",
+                    "default": None
+                }
+            },
+            "required": ["project_gid"]
+        }
+    },
+    {
+        "name": "get_task_details",
+        "description": "Get detailed information about a specific task",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "task_gid": {
+                    "type": "string",
+                    "description": "The GID of the task"
+                }
+            },
+            "required": ["task_gid"]
+        }
+    },
+    {
+        "name": "search_tasks",
+        "description": "Search for tasks based on various criteria",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Search text (can be empty)"
+                },
+                "assignee": {
+                    "type": "string",
+                    "description": "Filter by assignee name (optional)",
+                    "default": None
+                },
+                "completed": {
+                    "type": "boolean",
+                    "description": "Filter for completed status (optional)",
+                    "default": None
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of tasks to return",
+                    "default": 20
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "get_tasks_by_assignee",
+        "description": "Get tasks assigned to a specific person across all projects in the portfolio",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "assignee": {
+                    "type": "string",
+                    "description": "Name of the assignee"
+                },
+                "completed": {
+                    "type": "boolean",
+                    "description": "Filter for completed status (optional)",
+                    "default": None
+                }
+            },
+            "required": ["assignee"]
+        }
+    },
+    {
+        "name": "get_task_distribution_by_assignee",
+        "description": "Get task distribution statistics across all assignees",
+        "parameters": {
+            "type": "object",
+            "properties": {}
+        }
+    },
+    {
+        "name": "get_task_completion_trend",
+        "description": "Get task completion trend over a specified time period",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "days": {
+                    "type": "integer",
+                    "description": "Number of days to analyze",
+                    "default": 30
+                }
+            }
+        }
+    },
+    {
+        "name": "get_projects_by_owner",
+        "description": "Get all projects owned by a specific person",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "owner_name": {
+                    "type": "string",
+                    "description": "Name of the project owner"
+                },
+                "portfolio_gid": {
+                    "type": "string",
+                    "description": "The GID of the portfolio (optional, will use configured value if not provided)"
+                }
+            },
+            "required": ["owner_name"]
+        }
+    },
+    {
+        "name": "get_project_gid_by_name",
+        "description": "Find a project's GID by its name",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "project_name": {
+                    "type": "string",
+                    "description": "Name of the project to find"
+                }
+            },
+            "required": ["project_name"]
+        }
+    },
+    {
+        "name": "get_project_info_by_name",
+        "description": "Get detailed information about a project by its name",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "project_name": {
+                    "type": "string",
+                    "description": "Name of the project to find"
+                }
+            },
+            "required": ["project_name"]
+        }
+    },
+    {
+        "name": "create_direct_chart",
+        "description": "Create a chart that can be directly rendered in Streamlit chat (preferred approach for charts). "
+                       "Bar, line and scatter charts take x_data and y_data; pie charts take names and values; "
+                       "workload charts take assignees with visualization_type 'resource_allocation'.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "chart_type": {
+                    "type": "string",
+                    "description": "Type of chart to create (bar, line, pie, scatter, etc.)"
+                },
+                "title": {
+                    "type": "string",
+                    "description": "Title for the chart"
+                },
+                "x_data": {
+                    "type": "array",
+                    "description": "Data for x-axis (for bar, line, scatter charts)",
+                    "items": {
+                        "oneOf": [
+                            {"type": "string"},
+                            {"type": "number"}
+                        ]
+                    }
+                },
+                "y_data": {
+                    "type": "array",
+                    "description": "Data for y-axis (for bar, line, scatter charts)",
+                    "items": {
+                        "oneOf": [
+                            {"type": "string"},
+                            {"type": "number"}
+                        ]
+                    }
+                },
+                "names": {
+                    "type": "array",
+                    "description": "Category names (for pie charts, or as labels)",
+                    "items": {
+                        "type": "string"
+                    }
+                },
+                "values": {
+                    "type": "array",
+                    "description": "Values corresponding to names (for pie charts)",
+                    "items": {
+                        "type": "number"
+                    }
+                },
+                "labels": {
+                    "type": "object",
+                    "description": "Axis and data labels (e.g. {\"x\": \"Time\", \"y\": \"Value\"})"
+                },
+                "assignees": {
+                    "type": "array",
+                    "description": "For resource allocation charts - list of assignee objects with name and task count",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "assignee": {
+                                "type": "string",
+                                "description": "Name of the assignee"
+                            },
+                            "total_tasks": {
+                                "type": "integer",
+                                "description": "Number of tasks assigned"
+                            }
+                        }
+                    }
+                },
+                "visualization_type": {
+                    "type": "string",
+                    "description": "Legacy parameter - for compatibility with old code. Use chart_type instead.",
+                    "enum": ["resource_allocation", "task_status", "timeline", "velocity", "burndown", "project_progress"]
+                }
+            },
+            "required": ["title"]
+        }
+    }
+)
+
+# FUNCTION_SPECS wrapped in the tools format the chat completions API expects
+OPENAI_TOOLS = tuple({"type": "function", "function": spec} for spec in FUNCTION_SPECS)
+
+# Names of the functions in FUNCTION_SPECS, in order
+FUNCTION_NAMES = tuple(spec["name"] for spec in FUNCTION_SPECS)
+
+# Functions implemented by the assistant itself; the rest are AsanaToolSet methods of the same name
+ASSISTANT_FUNCTIONS = frozenset({"create_direct_chart"})
+
+# System prompt for a new conversation, filled in with str.format. It is sent
+# with every request, so it is kept to a short list of rules
+SYSTEM_PROMPT_TEMPLATE = """You are an Asana project management assistant. Your tools read projects, tasks, assignees and trends, and draw charts.
+
+Configuration: portfolio_gid={portfolio_gid}, team_gid={team_gid}. Both are already set in the tools.
+
+Rules:
+1. Never ask the user for a GID or any other ID, never mention GIDs, and never use placeholder IDs. If the configuration is missing, tell the user to select a portfolio in the app settings.
+2. Call tools before asking anything. Portfolio overview: get_portfolio_projects() with no arguments. Workload: get_task_distribution_by_assignee(). Trends: get_task_completion_trend().
+3. Look up people and projects by name with get_projects_by_owner, get_tasks_by_assignee and get_project_info_by_name. Only pass numeric GIDs from tool results to get_project_details or get_project_tasks, never names.
+4. If a reference is ambiguous, make a reasonable guess from context; ask only when choosing between specific options.
+5. Answer concisely and only from tool data.
+6. For charts use only create_direct_chart with a descriptive title, then explain the insights: highest and lowest workloads, largest categories, projects at risk, trend direction, recommendations.
+7. Format in Markdown: ## and ### headers, - bullet lists, tables with header rows, **bold** key metrics, blank lines between blocks, percentages to 1 decimal place.
+"""
+
+# Greeting added after the system prompt in a new conversation
+INITIAL_GREETING = "Hello! I can help you analyze your Asana projects by directly accessing your data. What would you like to know?"
+
+# Below this many items a plain sorted() beats NumPy's per-call overhead
+NUMPY_SORT_MIN_ITEMS = 32
+
+
+def _sort_desc(names: List[str], values: List[Any]) -> Tuple[List[str], List[Any]]:
+    """
+    Sort names by their values in descending order, keeping ties in input order.
+
+    Args:
+        names: Labels, one per value
+        values: Numeric values to sort by
+
+    Returns:
+        Tuple of (sorted names, sorted values) as lists
+    """
+    if len(values) < NUMPY_SORT_MIN_ITEMS:
+        order = sorted(range(len(values)), key=values.__getitem__, reverse=True)
+        return [names[i] for i in order], [values[i] for i in order]
+
+    v = np.asarray(values)
+    # Negate rather than reverse a stable ascending sort, so ties keep their input order
+    order = np.argsort(-v, kind="stable")
+    return [names[i] for i in order], v[order].tolist()
+
+
 class FunctionCallingAssistant:
     """
     Assistant that uses OpenAI's function calling to interact with Asana API.
@@ -43,6 +594,24 @@ class FunctionCallingAssistant:
     function calling, and generates responses with visualizations.
     """
     
+    # One instance lives per Streamlit session; every attribute is set in __init__
+    __slots__ = (
+        "logger",
+        "api_instances",
+        "temperature",
+        "tools",
+        "client",
+        "conversation_history",
+        "_last_user_query",
+        "memory",
+        "_viz",
+        "_direct_chart",
+        "processed_tool_call_ids",
+        "_tool_cache",
+        "available_functions",
+        "function_specs",
+    )
+    
     def __init__(self, api_instances: Dict[str, Any]):
         """
         Initialize the function calling assistant.
@@ -69,290 +638,30 @@ class FunctionCallingAssistant:
         # Initialize conversation history
         self.conversation_history = []
         
+        # Content of the most recent user message, kept up to date by _append_text_message
+        self._last_user_query = None
+        
         # Initialize memory to store temporary data per conversation
         self.memory = {}
         
+        # Visualization info and direct chart config prepared by the last response, if any
+        self._viz = None
+        self._direct_chart = None
+        
         # Track processed tool call IDs to avoid duplicates
-        self.processed_tool_call_ids = set()
+        self.processed_tool_call_ids = RecentIdSet()
+        
+        # Serialized results of recent read-only tool calls, by (function name, arguments)
+        self._tool_cache = OrderedDict()
         
-        # Define available functions
+        # Define available functions, one per function specification
         self.available_functions = {
-            "get_portfolio_projects": self.tools.get_portfolio_projects,
-            "get_project_details": self.tools.get_project_details,
-            "get_project_tasks": self.tools.get_project_tasks,
-            "get_task_details": self.tools.get_task_details,
-            "search_tasks": self.tools.search_tasks,
-            "get_tasks_by_assignee": self.tools.get_tasks_by_assignee,
-            "get_projects_by_owner": self.tools.get_projects_by_owner,
-            "get_project_gid_by_name": self.tools.get_project_gid_by_name,
-            "get_project_info_by_name": self.tools.get_project_info_by_name,
-            "get_task_distribution_by_assignee": self.tools.get_task_distribution_by_assignee,
-            "get_task_completion_trend": self.tools.get_task_completion_trend,
-            "create_direct_chart": self.create_direct_chart
+            name: getattr(self if name in ASSISTANT_FUNCTIONS else self.tools, name)
+            for name in FUNCTION_NAMES
         }
         
         # Define function specifications
-        self.function_specs = [
-            {
-                "name": "get_portfolio_projects",
-                "description": "Get all projects in a portfolio",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "portfolio_gid": {
-                            "type": "string",
-                            "description": "The GID of the portfolio (optional, will use configured value if not provided)"
-                        }
-                    }
-                }
-            },
-            {
-                "name": "get_project_details",
-                "description": "Get detailed information about a specific project",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "project_gid": {
-                            "type": "string",
-                            "description": "The GID of the project"
-                        }
-                    },
-                    "required": ["project_gid"]
-                }
-            },
-            {
-                "name": "get_project_tasks",
-                "description": "Get tasks for a specific project",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "project_gid": {
-                            "type": "string",
-                            "description": "The GID of the project"
-                        },
-                        "limit": {
-                            "type": "integer",
-                            "description": "Maximum number of tasks to return",
-                            "default": 50
-                        },
-                        "completed": {
-                            "type": "boolean",
-                            "description": "Filter for completed tasks (null for all tasks)",
-                            "default": None
-                        }
-                    },
-                    "required": ["project_gid"]
-                }
-            },
-            {
-                "name": "get_task_details",
-                "description": "Get detailed information about a specific task",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "task_gid": {
-                            "type": "string",
-                            "description": "The GID of the task"
-                        }
-                    },
-                    "required": ["task_gid"]
-                }
-            },
-            {
-                "name": "search_tasks",
-                "description": "Search for tasks based on various criteria",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "Search text (can be empty)"
-                        },
-                        "assignee": {
-                            "type": "string",
-                            "description": "Filter by assignee name (optional)",
-                            "default": None
-                        },
-                        "completed": {
-                            "type": "boolean",
-                            "description": "Filter for completed status (optional)",
-                            "default": None
-                        },
-                        "limit": {
-                            "type": "integer",
-                            "description": "Maximum number of tasks to return",
-                            "default": 20
-                        }
-                    },
-                    "required": ["query"]
-                }
-            },
-            {
-                "name": "get_tasks_by_assignee",
-                "description": "Get tasks assigned to a specific person across all projects in the portfolio",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "assignee": {
-                            "type": "string",
-                            "description": "Name of the assignee"
-                        },
-                        "completed": {
-                            "type": "boolean",
-                            "description": "Filter for completed status (optional)",
-                            "default": None
-                        }
-                    },
-                    "required": ["assignee"]
-                }
-            },
-            {
-                "name": "get_task_distribution_by_assignee",
-                "description": "Get task distribution statistics across all assignees",
-                "parameters": {
-                    "type": "object",
-                    "properties": {}
-                }
-            },
-            {
-                "name": "get_task_completion_trend",
-                "description": "Get task completion trend over a specified time period",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "days": {
-                            "type": "integer",
-                            "description": "Number of days to analyze",
-                            "default": 30
-                        }
-                    }
-                }
-            },
-            {
-                "name": "get_projects_by_owner",
-                "description": "Get all projects owned by a specific person",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "owner_name": {
-                            "type": "string",
-                            "description": "Name of the project owner"
-                        },
-                        "portfolio_gid": {
-                            "type": "string",
-                            "description": "The GID of the portfolio (optional, will use configured value if not provided)"
-                        }
-                    },
-                    "required": ["owner_name"]
-                }
-            },
-            {
-                "name": "get_project_gid_by_name",
-                "description": "Find a project's GID by its name",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "project_name": {
-                            "type": "string",
-                            "description": "Name of the project to find"
-                        }
-                    },
-                    "required": ["project_name"]
-                }
-            },
-            {
-                "name": "get_project_info_by_name",
-                "description": "Get detailed information about a project by its name",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "project_name": {
-                            "type": "string",
-                            "description": "Name of the project to find"
-                        }
-                    },
-                    "required": ["project_name"]
-                }
-            },
-            {
-                "name": "create_direct_chart",
-                "description": "Create a chart that can be directly rendered in Streamlit chat (preferred approach for charts)",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "chart_type": {
-                            "type": "string",
-                            "description": "Type of chart to create (bar, line, pie, scatter, etc.)"
-                        },
-                        "title": {
-                            "type": "string",
-                            "description": "Title for the chart"
-                        },
-                        "x_data": {
-                            "type": "array",
-                            "description": "Data for x-axis (for bar, line, scatter charts)",
-                            "items": {
-                                "oneOf": [
-                                    {"type": "string"},
-                                    {"type": "number"}
-                                ]
-                            }
-                        },
-                        "y_data": {
-                            "type": "array",
-                            "description": "Data for y-axis (for bar, line, scatter charts)",
-                            "items": {
-                                "oneOf": [
-                                    {"type": "string"},
-                                    {"type": "number"}
-                                ]
-                            }
-                        },
-                        "names": {
-                            "type": "array",
-                            "description": "Category names (for pie charts, or as labels)",
-                            "items": {
-                                "type": "string"
-                            }
-                        },
-                        "values": {
-                            "type": "array",
-                            "description": "Values corresponding to names (for pie charts)",
-                            "items": {
-                                "type": "number"
-                            }
-                        },
-                        "labels": {
-                            "type": "object",
-                            "description": "Axis and data labels (e.g. {\"x\": \"Time\", \"y\": \"Value\"})"
-                        },
-                        "assignees": {
-                            "type": "array",
-                            "description": "For resource allocation charts - list of assignee objects with name and task count",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "assignee": {
-                                        "type": "string",
-                                        "description": "Name of the assignee"
-                                    },
-                                    "total_tasks": {
-                                        "type": "integer",
-                                        "description": "Number of tasks assigned"
-                                    }
-                                }
-                            }
-                        },
-                        "visualization_type": {
-                            "type": "string",
-                            "description": "Legacy parameter - for compatibility with old code. Use chart_type instead.",
-                            "enum": ["resource_allocation", "task_status", "timeline", "velocity", "burndown", "project_progress"]
-                        }
-                    },
-                    "required": ["title"]
-                }
-            }
-        ]
+        self.function_specs = FUNCTION_SPECS
         
         self.logger.info("FunctionCallingAssistant initialized successfully")
     
@@ -380,19 +689,47 @@ class FunctionCallingAssistant:
             if not tool_call_id:
                 self.logger.warning("Cannot add tool message without tool_call_id, skipping")
                 return
-                
-            message = {"role": role, "tool_call_id": tool_call_id, "content": content}
-            self.conversation_history.append(message)
+            self._append_tool_result(tool_call_id, content)
             return
         
-        message = {"role": role, "content": content}
-        self.conversation_history.append(message)
+        self._append_text_message(role, content)
+    
+    def _append_text_message(self, role: str, content: str) -> None:
+        """
+        Append a user, assistant or system message to the conversation history.
+        
+        Args:
+            role: Role of the message sender
+            content: Message content
+        """
+        self.conversation_history.append({"role": role, "content": content})
+        if role == "user":
+            self._last_user_query = content
+    
+    def _append_tool_result(self, tool_call_id: str, content: str) -> None:
+        """
+        Append a tool response to the conversation history.
+        
+        Args:
+            tool_call_id: ID of the tool call this message is responding to
+            content: Serialized function response
+            
+        Raises:
+            ValueError: If tool_call_id is empty
+        """
+        if not tool_call_id:
+            raise ValueError("Tool message requires a tool_call_id")
+        self.conversation_history.append({"role": "tool", "tool_call_id": tool_call_id, "content": content})
     
     def reset_conversation(self) -> None:
         """Reset the conversation history and memory."""
         self.conversation_history = []
+        self._last_user_query = None
         self.memory = {}
-        self.processed_tool_call_ids = set()
+        self._viz = None
+        self._direct_chart = None
+        self.processed_tool_call_ids = RecentIdSet()
+        self._tool_cache.clear()
         self.logger.info("Conversation history and memory reset")
     
     def initialize_conversation(self) -> None:
@@ -403,151 +740,11 @@ class FunctionCallingAssistant:
         portfolio_gid = st.session_state.get("portfolio_gid", "")
         team_gid = st.session_state.get("team_gid", "")
         
-        # Add initial critical system message about GIDs
-        initial_system_message = """
-        CRITICAL INSTRUCTION: You are an Asana project management assistant that MUST NEVER ask users for GIDs or IDs of any kind.
-        
-        The correct portfolio_gid=""" + portfolio_gid + """ is ALREADY loaded in the system. Always use this GID automatically without mentioning it.
-        
-        When users ask about portfolio data, projects, or trends, IMMEDIATELY call get_portfolio_projects() with NO arguments.
-        The function will automatically use the correct GID from the session state.
-        
-        For ANY query related to portfolio, workload, or trends, ALWAYS call these functions WITHOUT asking for IDs:
-        1. get_portfolio_projects() - To get all projects
-        2. get_task_distribution_by_assignee() - To analyze workload
-        3. get_task_completion_trend() - To analyze trends
-        
-        NEVER mention, reference, or ask for GIDs in your responses.
-        """
-        
         # Clear conversation history to ensure we start fresh
-        self.conversation_history = []
-        
-        # Add the critical system message as the first message
-        self.conversation_history.append({"role": "system", "content": initial_system_message})
-        
-        # Add detailed system message with instructions
-        system_message = """
-        You are an AI assistant for Asana project management. You can access information about Asana projects, tasks, timelines, and resource allocation.
-        
-        IMPORTANT CONFIGURATION:
-        - Portfolio GID: """ + portfolio_gid + """
-        - Team GID: """ + team_gid + """
-        
-        GID HANDLING (CRITICAL):
-        - NEVER ask the user for any GIDs or IDs. This is the single most important rule.
-        - NEVER use placeholder values like 'your_portfolio_gid_here'.
-        - The portfolio_gid (""" + portfolio_gid + """) is ALREADY configured in the system.
-        - The team_gid (""" + team_gid + """) is ALREADY configured in the system.
-        - ALWAYS use these pre-configured GIDs in your function calls automatically without mentioning them to the user.
-        - If a GID is missing or invalid, inform the user they need to configure their portfolio in the app settings.
-        - NEVER mention GIDs in your responses unless reporting an error about configuration.
-        - NEVER, under any circumstances, ask the user to "provide a GID" or any variation of this request.
-        - Instead of asking for GIDs, directly use the tools available with the GIDs that are already configured.
-        
-        OUTPUT FORMATTING (CRITICAL FOR STREAMLIT DISPLAY):
-        - Always format your responses with proper Markdown for optimal display in Streamlit's chat interface.
-        - Use headers (## for main sections, ### for subsections) with double blank lines before each header.
-        - Format all lists with bullets (- item) with a blank line before the list starts and proper indentation.
-        - For tables, use proper Markdown table formatting with headers and dividers. Include a blank line before and after tables.
-        - Ensure consistent digit formatting for numbers (e.g., percentages to 1 decimal place, currency with 2 decimal places).
-        - Use **bold text** for important metrics, findings, or action items to make them stand out.
-        - When creating sections, use clear visual hierarchy with proper spacing (double line breaks between sections).
-        - Use horizontal rules (---) with blank lines before and after to separate major content sections.
-        - For code blocks or technical information, use proper markdown code formatting with ```code```.
-        - Ensure all paragraphs are separated by blank lines for better readability.
-        - When mentioning specific data points that exist in visualizations, bold these metrics for emphasis.
-        
-        INTERACTION GUIDELINES:
-        - ALWAYS give direct answers based on the data without asking the user for additional information that should be in the system.
-        - ALWAYS attempt to use the tools available to you before asking the user for clarification.
-        - If you're unsure about which specific entity the user is referring to, make a reasonable guess based on context.
-        - Only ask for clarification when genuinely ambiguous between multiple specific options.
-        - If the user asks for portfolio information, immediately use get_portfolio_projects() without asking for any GID.
-        - If the user asks about trends, use get_task_completion_trend() and get_task_distribution_by_assignee().
-        
-        STREAMLIT VISUALIZATION BEST PRACTICES:
-        - When creating visualizations, always aim for high readability and information density.
-        - Ensure all visualizations have clear, descriptive titles that explain what the user is looking at.
-        - After showing a visualization, always include a short paragraph interpreting the key insights shown in the chart.
-        - Point out interesting patterns, outliers, or actionable insights from the visualization.
-        - For resource allocation charts, identify team members with highest/lowest workloads.
-        - For status distributions, highlight the largest categories and what they indicate.
-        - For timeline visualizations, point out projects that are behind schedule or at risk.
-        - For trend analysis, note if patterns are improving or declining over time.
-        - When possible, make specific recommendations based on the visualization data.
-        
-        When answering questions:
-        1. Use the available functions to get the specific data you need from Asana.
-        2. Provide concise, accurate information based on the actual data.
-        3. When appropriate, generate visualizations to help understand the data using streamlit functions.
-        4. For questions about specific projects or tasks, get detailed information.
-        5. For questions about trends or analytics, use relevant metrics and create visual representations.
-        6. Always base your responses on actual Asana data, not assumptions.
-        
-        IMPORTANT QUERY HANDLING:
-        - For questions about a person's projects (e.g., "Tell me about John Smith's projects"),
-          use the get_projects_by_owner function with the person's name, rather than asking for a GID.
-        - For questions about tasks assigned to someone (e.g., "What tasks does John Smith have?"),
-          use the get_tasks_by_assignee function with the person's name.
-        - For questions about specific projects (e.g., "Tell me about the Marketing Campaign project"),
-          use get_project_info_by_name function with the project name. DO NOT try to use the project name as a GID.
-        - For questions about specific project details only after you have the project GID,
-          use get_project_details or get_project_tasks with the GID.
-        - NEVER try to use a project name, task name, or any natural language text as a GID.
-          GIDs are numeric identifiers, not text names.
-        
-        DATA VISUALIZATION:
-        - ALWAYS use create_visualization function when questions involve data comparison, trends, or distributions.
-        - For workload analysis, use the create_visualization function with "resource_allocation" type.
-        - For task status distribution, use the "task_status" visualization type.
-        - For project timelines, use the "timeline" visualization type.
-        - For project progress tracking, use the "project_progress" visualization type.
-        - For completion trend analysis, use "velocity" or "burndown" visualization types.
-        - Always include a descriptive title for any visualization you create.
-        - You can pass visualization data either nested inside a 'data' parameter or directly as parameters.
-        - After creating a visualization, explain the insights revealed by the visualization in your text response.
-        
-        VISUALIZATION DATA FORMAT EXAMPLES:
-        - For task_status: directly pass 'statuses' parameter as: {"Completed": 5, "In Progress": 10, "Not Started": 3}
-        - For resource_allocation: directly pass 'assignees' parameter as: [{"assignee": "Name", "total_tasks": 10}, ...]
-        - For project_progress: directly pass 'projects' parameter as: [{"name": "Project A", "completion_percentage": 75}, ...]
-        - For timeline: directly pass 'projects' parameter as: [{"name": "Project B", "due_date": "2023-12-31", "start_date": "2023-10-01"}, ...]
-        - For velocity/burndown: directly pass 'trend_data' parameter as: [{"date": "2023-10-01", "completed_tasks": 5, "created_tasks": 8}, ...]
-        
-        You can handle queries about:
-        - Project status and progress
-        - Task distribution and completion rates
-        - Resource allocation and team workload
-        - Timeline and scheduling
-        - Recommendations for project management
-        
-        For visualizations, you can create:
-        - "timeline" for project schedules and deadlines
-        - "resource_allocation" for team workload distribution
-        - "task_status" for task completion status distribution
-        - "velocity" for team productivity over time
-        - "burndown" for task completion trend analysis
-        - "project_progress" for project completion percentage
-        
-        Always get the most up-to-date information by calling the API functions.
-        """
-        
-        # Add the main system message
-        self.conversation_history.append({"role": "system", "content": system_message})
-        
-        # Add a final reminder to be absolutely sure
-        reminder_message = f"""
-        FINAL REMINDER: You MUST NEVER ask users for GIDs. The portfolio_gid={portfolio_gid} is already in the system.
-        For portfolio queries, immediately call get_portfolio_projects() without parameters.
-        """
-        self.conversation_history.append({"role": "system", "content": reminder_message})
-        
-        # Add initial assistant message (optional)
-        self.conversation_history.append({
-            "role": "assistant", 
-            "content": "Hello! I can help you analyze your Asana projects by directly accessing your data. What would you like to know?"
-        })
+        self.conversation_history = [
+            {"role": "system", "content": SYSTEM_PROMPT_TEMPLATE.format(portfolio_gid=portfolio_gid, team_gid=team_gid)},
+            {"role": "assistant", "content": INITIAL_GREETING}
+        ]
         
         self.logger.info(f"Conversation initialized with system instructions, portfolio_gid={portfolio_gid}, team_gid={team_gid}")
     
@@ -571,15 +768,15 @@ class FunctionCallingAssistant:
             
             # Handle visualization-specific data passed directly as kwargs
             # Combine all kwargs into the data dict
-            for key, value in kwargs.items():
-                data[key] = value
+            data.update(kwargs)
             
             # Enhanced logging for debugging
-            self.logger.info(f"Creating visualization of type '{visualization_type}' with title '{title}'")
-            self.logger.info(f"Visualization data keys: {list(data.keys()) if data else 'None'}")
+            self.logger.info("Creating visualization of type '%s' with title '%s'", visualization_type, title)
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Visualization data keys: %s", list(data.keys()) if data else 'None')
             
             # Store the visualization info in memory
-            self.memory["visualization"] = {
+            self._viz = {
                 "type": visualization_type,
                 "title": title,
                 "data": data
@@ -591,7 +788,7 @@ class FunctionCallingAssistant:
                 "message": f"Visualization of type '{visualization_type}' has been prepared with title '{title}'."
             }
         except Exception as e:
-            self.logger.error(f"Error creating visualization: {e}")
+            self.logger.error("Error creating visualization: %s", e)
             return {
                 "status": "error",
                 "error": str(e),
@@ -632,14 +829,10 @@ class FunctionCallingAssistant:
             }
             
             # Add core data elements
-            if x_data is not None:
-                chart_data["x_data"] = x_data
-            if y_data is not None:
-                chart_data["y_data"] = y_data
-            if names is not None:
-                chart_data["names"] = names
-            if values is not None:
-                chart_data["values"] = values
+            chart_data.update({
+                k: v for k, v in (("x_data", x_data), ("y_data", y_data), ("names", names), ("values", values))
+                if v is not None
+            })
                 
             # Add configuration options
             if labels is not None:
@@ -652,17 +845,16 @@ class FunctionCallingAssistant:
                 chart_data["configuration"]["width"] = width
                 
             # Add any additional configuration options
-            for key, value in kwargs.items():
-                chart_data["configuration"][key] = value
+            chart_data["configuration"].update(kwargs)
                 
             # Store in memory for visualization generation
-            self.memory["visualization"] = {
+            self._viz = {
                 "type": "generic_chart",
                 "title": title,
                 "data": chart_data
             }
             
-            self.logger.info(f"Created {chart_type} chart configuration with title '{title}'")
+            self.logger.info("Created %s chart configuration with title '%s'", chart_type, title)
             
             return {
                 "status": "success",
@@ -671,7 +863,7 @@ class FunctionCallingAssistant:
                 "message": f"Chart of type '{chart_type}' has been prepared with title '{title}'."
             }
         except Exception as e:
-            self.logger.error(f"Error creating chart: {e}")
+            self.logger.error("Error creating chart: %s", e)
             return {
                 "status": "error",
                 "error": str(e),
@@ -710,7 +902,7 @@ class FunctionCallingAssistant:
                     chart_type = "bar"  # Resource allocation uses horizontal bar charts
                 elif visualization_type == "task_status":
                     chart_type = "pie"  # Task status uses pie charts
-                self.logger.info(f"Converting visualization_type '{visualization_type}' to chart_type '{chart_type}'")
+                self.logger.info("Converting visualization_type '%s' to chart_type '%s'", visualization_type, chart_type)
 
             # Prepare chart data for direct rendering
             chart_info = {
@@ -721,48 +913,41 @@ class FunctionCallingAssistant:
             
             # Process resource allocation data (coming from assignees parameter)
             if assignees and isinstance(assignees, list):
-                self.logger.info(f"Processing assignees data with {len(assignees)} items")
+                self.logger.info("Processing assignees data with %d items", len(assignees))
                 # Extract assignee names and task counts
                 names = [item.get("assignee", "Unknown") for item in assignees]
                 values = [item.get("total_tasks", 0) for item in assignees]
                 
                 # Sort by task count (descending) for better visualization
-                if names and values:
-                    sorted_data = sorted(zip(names, values), key=lambda x: x[1], reverse=True)
-                    names, values = zip(*sorted_data)
+                names, values = _sort_desc(names, values)
                 
                 # For resource allocation charts, we'll use a horizontal bar chart
                 # where x = values (task counts) and y = names (assignees)
                 chart_info["chart_type"] = "bar"  # Force to bar chart
-                chart_info["x_data"] = list(values)  # Task counts become x-axis for horizontal bar
-                chart_info["y_data"] = list(names)   # Assignee names become y-axis
+                chart_info["x_data"] = values  # Task counts become x-axis for horizontal bar
+                chart_info["y_data"] = names   # Assignee names become y-axis
                 chart_info["horizontal"] = True      # Mark as horizontal bar chart
                 
                 # Add appropriate labels
                 chart_info["labels"] = {"x": "Number of Tasks", "y": "Team Member"}
             else:
                 # Add core data elements for other chart types
-                if x_data is not None:
-                    chart_info["x_data"] = x_data
-                if y_data is not None:
-                    chart_info["y_data"] = y_data
-                if names is not None:
-                    chart_info["names"] = names
-                if values is not None:
-                    chart_info["values"] = values
+                chart_info.update({
+                    k: v for k, v in (("x_data", x_data), ("y_data", y_data), ("names", names), ("values", values))
+                    if v is not None
+                })
             
                 # Add labels
                 if labels is not None:
                     chart_info["labels"] = labels
             
             # Add any additional configuration options
-            for key, value in kwargs.items():
-                chart_info[key] = value
+            chart_info.update(kwargs)
                 
             # Store for direct rendering
-            self.memory["direct_chart"] = chart_info
+            self._direct_chart = chart_info
             
-            self.logger.info(f"Created direct {chart_type} chart with title '{title}'")
+            self.logger.info("Created direct %s chart with title '%s'", chart_type, title)
             
             return {
                 "status": "success",
@@ -772,7 +957,7 @@ class FunctionCallingAssistant:
                 "message": f"Chart of type '{chart_type}' has been prepared with title '{title}' for direct rendering."
             }
         except Exception as e:
-            self.logger.error(f"Error creating direct chart: {e}")
+            self.logger.error("Error creating direct chart: %s", e)
             return {
                 "status": "error",
                 "error": str(e),
@@ -786,43 +971,27 @@ class FunctionCallingAssistant:
         Returns:
             Plotly figure object or None if no visualization can be generated
         """
-        if "visualization" not in self.memory:
+        if self._viz is None:
             return None
+        
+        return self._build_figure(self._viz)
+    
+    def _build_figure(self, viz_info: Dict[str, Any]) -> go.Figure:
+        """
+        Build the Plotly figure for a stored visualization.
+        
+        Args:
+            viz_info: Visualization info stored in memory by a visualization tool
             
-        viz_info = self.memory["visualization"]
+        Returns:
+            Plotly figure object
+        """
         viz_type = viz_info.get("type")
         
         try:
             # Create base figure with good defaults
-            fig = go.Figure()
-            fig.update_layout(
-                title={
-                    'text': viz_info.get("title", "Visualization"),
-                    'font': {'size': 20, 'color': '#333333', 'family': 'Arial, sans-serif'},
-                    'y': 0.95,
-                    'x': 0.5,
-                    'xanchor': 'center',
-                    'yanchor': 'top'
-                },
-                plot_bgcolor='rgba(245,245,245,0.8)',
-                paper_bgcolor='rgba(245,245,245,0.8)',
-                font=dict(family='Arial, sans-serif', color='#333333'),
-                margin=dict(l=40, r=40, t=80, b=40),
-                autosize=True,
-                height=450,
-                hoverlabel=dict(
-                    bgcolor="white",
-                    font_size=12,
-                    font_family="Arial, sans-serif"
-                ),
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=-0.15,
-                    xanchor="center",
-                    x=0.5
-                )
-            )
+            fig = go.Figure(layout=_BASE_LAYOUT)
+            fig.layout.title.text = viz_info.get("title", "Visualization")
             
             # Get data
             data = viz_info.get("data", {})
@@ -833,23 +1002,20 @@ class FunctionCallingAssistant:
                 config = data.get("configuration", {})
                 
                 # Apply custom height and width if specified
-                if "height" in config:
+                if config.get("height", _BASE_LAYOUT.height) != _BASE_LAYOUT.height:
                     fig.update_layout(height=config["height"])
                 if "width" in config:
                     fig.update_layout(width=config["width"])
                 
                 # Get color scheme
                 color_scheme = config.get("color_scheme")
-                colors = None
-                if color_scheme:
-                    try:
-                        if hasattr(px.colors.sequential, color_scheme):
-                            colors = getattr(px.colors.sequential, color_scheme)
-                        elif hasattr(px.colors.qualitative, color_scheme):
-                            colors = getattr(px.colors.qualitative, color_scheme)
-                    except:
-                        # Default to a safe color scheme
-                        colors = px.colors.qualitative.Plotly
+                if not color_scheme:
+                    colors = None
+                elif isinstance(color_scheme, str):
+                    colors = _COLOR_SCHEMES.get(color_scheme)
+                else:
+                    # Default to a safe color scheme
+                    colors = _DEFAULT_COLORS
                 
                 # Set axis labels if provided
                 labels = config.get("labels", {})
@@ -860,81 +1026,9 @@ class FunctionCallingAssistant:
                         fig.update_yaxes(title_text=labels["y"])
                 
                 # Create specific chart types
-                if chart_type == "bar":
-                    x_data = data.get("x_data", [])
-                    y_data = data.get("y_data", [])
-                    
-                    # Handle orientation
-                    orientation = config.get("orientation", "v")
-                    
-                    if orientation == "h":
-                        fig.add_trace(go.Bar(
-                            y=x_data,  # For horizontal, x and y are swapped
-                            x=y_data,
-                            orientation='h',
-                            marker_color=colors[0] if colors else None
-                        ))
-                        # For horizontal bar charts, often you want the highest values at the top
-                        fig.update_layout(yaxis=dict(autorange="reversed"))
-                    else:
-                        fig.add_trace(go.Bar(
-                            x=x_data,
-                            y=y_data,
-                            marker_color=colors[0] if colors else None
-                        ))
-                
-                elif chart_type == "line":
-                    x_data = data.get("x_data", [])
-                    y_data = data.get("y_data", [])
-                    
-                    fig.add_trace(go.Scatter(
-                        x=x_data,
-                        y=y_data,
-                        mode='lines+markers',
-                        line=dict(color=colors[0] if colors else None, width=3),
-                        marker=dict(size=8)
-                    ))
-                
-                elif chart_type == "pie":
-                    names = data.get("names", [])
-                    values = data.get("values", [])
-                    
-                    fig.add_trace(go.Pie(
-                        labels=names,
-                        values=values,
-                        hole=config.get("hole", 0.4),
-                        textinfo=config.get("textinfo", "percent+label"),
-                        textposition=config.get("textposition", "inside"),
-                        marker=dict(colors=colors)
-                    ))
-                
-                elif chart_type == "scatter":
-                    x_data = data.get("x_data", [])
-                    y_data = data.get("y_data", [])
-                    
-                    fig.add_trace(go.Scatter(
-                        x=x_data,
-                        y=y_data,
-                        mode='markers',
-                        marker=dict(
-                            size=config.get("marker_size", 10),
-                            color=colors[0] if colors else None
-                        )
-                    ))
-                
-                elif chart_type == "area":
-                    x_data = data.get("x_data", [])
-                    y_data = data.get("y_data", [])
-                    
-                    fig.add_trace(go.Scatter(
-                        x=x_data,
-                        y=y_data,
-                        mode='lines',
-                        fill='tozeroy',
-                        line=dict(color=colors[0] if colors else None, width=2),
-                    ))
-                
-                # Add more chart types as needed
+                builder = _CHART_BUILDERS.get(chart_type)
+                if builder:
+                    builder(fig, data, config, colors)
                 else:
                     # Unknown chart type - add an error annotation
                     fig.add_annotation(
@@ -962,7 +1056,7 @@ class FunctionCallingAssistant:
                             names=labels, values=values,
                             title=viz_info.get("title", "Task Status Distribution"),
                             hole=0.4,
-                            color_discrete_sequence=px.colors.qualitative.Set3,
+                            color_discrete_sequence=_STATUS_COLORS,
                         )
                         fig.update_traces(
                             textposition='inside',
@@ -977,11 +1071,7 @@ class FunctionCallingAssistant:
                         values = [a.get("total_tasks", 0) for a in assignees]
                         
                         # Sort by task count for better visualization
-                        sorted_data = sorted(zip(names, values), key=lambda x: x[1], reverse=True)
-                        if sorted_data:
-                            sorted_names, sorted_values = zip(*sorted_data)
-                        else:
-                            sorted_names, sorted_values = [], []
+                        sorted_names, sorted_values = _sort_desc(names, values)
                         
                         fig = px.bar(
                             x=sorted_values, y=sorted_names,
@@ -995,12 +1085,12 @@ class FunctionCallingAssistant:
                         # For other types, try to use the original function
                         try:
                             if viz_type == "timeline" and "projects" in data:
-                                df = pd.DataFrame(data["projects"])
+                                df = pd.DataFrame.from_records(data["projects"], columns=TIMELINE_COLUMNS)
                                 fig = viz_function(df)
                                 fig.update_layout(title=viz_info.get("title", "Timeline"))
                             elif viz_type in ["velocity", "burndown"] and "trend_data" in data:
                                 # Convert to DataFrame for these visualization types
-                                df = pd.DataFrame(data["trend_data"])
+                                df = pd.DataFrame.from_records(data["trend_data"], columns=TASK_TREND_COLUMNS)
                                 fig = viz_function(df)
                                 fig.update_layout(title=viz_info.get("title", viz_type.capitalize()))
                             elif viz_type == "project_progress" and "projects" in data:
@@ -1017,7 +1107,7 @@ class FunctionCallingAssistant:
                                     font=dict(size=16)
                                 )
                         except Exception as viz_func_error:
-                            self.logger.error(f"Error using visualization function for {viz_type}: {viz_func_error}")
+                            self.logger.error("Error using visualization function for %s: %s", viz_type, viz_func_error)
                             fig.add_annotation(
                                 text=f"Error creating {viz_type} visualization: {str(viz_func_error)}",
                                 xref="paper", yref="paper",
@@ -1027,7 +1117,7 @@ class FunctionCallingAssistant:
                             )
                 
                 except Exception as e:
-                    self.logger.error(f"Error creating {viz_type} visualization: {e}")
+                    self.logger.error("Error creating %s visualization: %s", viz_type, e)
                     fig.add_annotation(
                         text=f"Error creating visualization: {str(e)}",
                         xref="paper", yref="paper",
@@ -1047,8 +1137,9 @@ class FunctionCallingAssistant:
             
             return fig
             
-        except Exception as e:
-            self.logger.error(f"Error generating visualization: {e}")
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            # Malformed chart data from the model; anything else is a bug and should surface
+            self.logger.error("Error generating visualization: %s", e)
             # Return a simple error visualization
             fig = go.Figure()
             fig.add_annotation(
@@ -1068,7 +1159,8 @@ class FunctionCallingAssistant:
             query: User's query text
             
         Returns:
-            Dictionary containing the response text and optional visualization
+            Dictionary containing the response text and, under "visualization",
+            a zero-argument callable returning the Plotly figure (or None)
         """
         if not self.client:
             # Check if OpenAI API key is in session state
@@ -1084,7 +1176,7 @@ class FunctionCallingAssistant:
         # Validate portfolio_gid
         if not self.tools.portfolio_gid or self.tools.portfolio_gid == "your_portfolio_gid_here":
             # Add a special error message to conversation history
-            self.add_message_to_history("system", 
+            self._append_text_message("system", 
                 "The portfolio GID is missing or invalid. Please ensure a valid portfolio is selected in the application settings.")
                 
             # Create a properly formatted error message
@@ -1109,22 +1201,28 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
             }
         
         # Add user message to conversation history
-        self.add_message_to_history("user", query)
+        self._append_text_message("user", query)
         
         # Reset visualization memory
-        if "visualization" in self.memory:
-            del self.memory["visualization"]
+        self._viz = None
         
         # Get response by calling OpenAI API with function calling
         response = self._process_with_function_calling()
         
-        # Generate visualization if available
-        visualization = self.generate_visualization()
+        # Defer building the figure until the caller actually draws it; most
+        # turns are text-only and never render one
+        viz_info = self._viz
+        if viz_info is None:
+            visualization = None
+            viz_type = None
+        else:
+            visualization = functools.cache(lambda: self._build_figure(viz_info))
+            viz_type = viz_info.get("type")
         
         return {
             "text": response,
             "visualization": visualization,
-            "viz_type": self.memory.get("visualization", {}).get("type") if "visualization" in self.memory else None
+            "viz_type": viz_type
         }
     
     def _is_asking_for_gid(self, text: str) -> bool:
@@ -1137,69 +1235,24 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
         Returns:
             True if the response is asking for a GID, False otherwise
         """
-        # Look for common phrases that indicate asking for a GID
-        gid_request_phrases = [
-            "provide the gid",
-            "please provide the gid",
-            "provide the portfolio gid",
-            "provide me with the gid",
-            "provide me with the portfolio gid",
-            "provide the project gid",
-            "enter the gid",
-            "specify the gid",
-            "what is the gid",
-            "what's the gid",
-            "need the gid",
-            "please specify the gid",
-            "please enter the gid",
-            "send the gid",
-            "input the gid",
-            "add the gid",
-            "portfolio you are interested in",
-            "which portfolio",
-            "provide the portfolio",
-            "provide the id",
-            "provide the portfolio id",
-            "specify the portfolio",
-            "which portfolio gid",
-            "please provide",
-            "gid of the portfolio",
-            "id of the portfolio",
-            "portfolio id",
-            "provide me with",
-            "please give me",
-            "please provide me with"
-        ]
         
         # Check if any phrase is in the text (case insensitive)
         text_lower = text.lower()
         
+        # Most responses mention none of the prescreen words; skip the phrase scans for them
+        if not any(word in text_lower for word in GID_PRESCREEN_WORDS):
+            return False
+        
         # Check for explicit GID requests
-        for phrase in gid_request_phrases:
-            if phrase in text_lower:
-                self.logger.warning(f"Detected request for GID in response: '{text}'")
-                return True
+        if _GID_REQUEST_PATTERN.search(text_lower):
+            self.logger.warning(f"Detected request for GID in response: '{text}'")
+            return True
         
         # Check for questions about portfolio in first interaction
         if len(self.conversation_history) <= 3:  # Only the system message, assistant greeting, and user query
-            first_interaction_phrases = [
-                "which portfolio",
-                "portfolio are you",
-                "portfolio would you",
-                "portfolio do you",
-                "portfolio should",
-                "please provide",
-                "could you provide",
-                "can you provide",
-                "need to know which",
-                "need to know what",
-                "i'll need"
-            ]
-            
-            for phrase in first_interaction_phrases:
-                if phrase in text_lower:
-                    self.logger.warning(f"Detected likely GID request in first interaction: '{text}'")
-                    return True
+            if _FIRST_INTERACTION_PATTERN.search(text_lower):
+                self.logger.warning(f"Detected likely GID request in first interaction: '{text}'")
+                return True
         
         return False
     
@@ -1262,13 +1315,10 @@ Just a moment while I gather this information...
             force_end_after_iteration = False
             
             # Store the last user query for recovery in case of problems
-            last_user_query = None
-            for msg in reversed(self.conversation_history):
-                if msg.get("role") == "user":
-                    last_user_query = msg.get("content")
-                    break
+            last_user_query = self._last_user_query
             
-            # Sanitize conversation history before starting
+            # Keep the history to a bounded window, then sanitize it before starting
+            self._trim_conversation_history()
             self._sanitize_conversation_history()
             
             # Continue until we get a non-function-call response or reach max calls
@@ -1307,7 +1357,7 @@ Just a moment while I gather this information...
                     response = self.client.chat.completions.create(
                         model="gpt-4o",
                         messages=self.conversation_history,
-                        tools=[{"type": "function", "function": spec} for spec in self.function_specs],
+                        tools=OPENAI_TOOLS,
                         temperature=self.temperature  # Use instance temperature setting
                     )
                 except Exception as api_error:
@@ -1327,7 +1377,7 @@ Just a moment while I gather this information...
                         response = self.client.chat.completions.create(
                             model="gpt-4o",
                             messages=self.conversation_history,
-                            tools=[{"type": "function", "function": spec} for spec in self.function_specs],
+                            tools=OPENAI_TOOLS,
                             temperature=self.temperature
                         )
                     else:
@@ -1399,11 +1449,14 @@ Just a moment while I gather this information...
                         # Get a final response
                         continue
                         
+                    # Run the regular function calls concurrently up front
+                    tool_results = self._run_tool_calls(message.tool_calls)
+                    
                     # Process each function call
                     for tool_call in message.tool_calls:
                         # Extract function call details
                         function_name = tool_call.function.name
-                        function_args = json.loads(tool_call.function.arguments)
+                        function_args = orjson.loads(tool_call.function.arguments)
                         
                         # Log function call
                         self.logger.info(f"Function call: {function_name}({function_args})")
@@ -1507,7 +1560,9 @@ Just a moment while I gather this information...
                             function_response = None
                             if function_name in self.available_functions:
                                 try:
-                                    function_response = self.available_functions[function_name](**function_args)
+                                    function_response = tool_results[tool_call.id]
+                                    if isinstance(function_response, Exception):
+                                        raise function_response
                                 except Exception as func_error:
                                     # Handle function call errors gracefully
                                     self.logger.error(f"Error calling function {function_name}: {func_error}")
@@ -1532,19 +1587,12 @@ Just a moment while I gather this information...
                             
                         # Make sure function_response is properly JSON serialized
                         if not isinstance(function_response, str):
-                            try:
-                                function_response = json.dumps(function_response)
-                            except Exception as json_error:
-                                self.logger.error(f"Error serializing function response: {json_error}")
-                                function_response = json.dumps({"status": "error", "message": "Error serializing result"})
+                            # json_dumps logs encoding failures and returns an error payload instead
+                            function_response = json_dumps(function_response)
                         
                         # Add function response to conversation history
-                        self.logger.info(f"Adding tool response for tool_call_id={tool_call.id}")
-                        self.conversation_history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": function_response
-                        })
+                        self.logger.info("Adding tool response for tool_call_id=%s", tool_call.id)
+                        self._append_tool_result(tool_call.id, function_response)
                     
                     # If we need to force end after this iteration, add a system message and break the loop
                     if force_end_after_iteration:
@@ -1637,13 +1685,11 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
             return
         
         # Add user message to conversation history
-        self.add_message_to_history("user", query)
+        self._append_text_message("user", query)
         
         # Reset visualization memory
-        if "visualization" in self.memory:
-            del self.memory["visualization"]
-        if "direct_chart" in self.memory:
-            del self.memory["direct_chart"]
+        self._viz = None
+        self._direct_chart = None
         
         # Add a critical reminder about using direct_chart
         self.conversation_history.append({
@@ -1651,7 +1697,8 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
             "content": "IMPORTANT: When creating visualizations, use ONLY create_direct_chart function. Do NOT use create_visualization or create_chart functions as they are deprecated."
         })
         
-        # Sanitize conversation history before starting
+        # Keep the history to a bounded window, then sanitize it before starting
+        self._trim_conversation_history()
         self._sanitize_conversation_history()
         
         # Process function calls and generate streaming response
@@ -1716,17 +1763,10 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                 # Debug the conversation history structure
                 self._debug_conversation_history()
                 
-                # For function calls, we need to use non-streaming API calls
+                # Stream the response, showing text as it arrives; tool calls are
+                # collected from the stream and handled below
                 try:
-                    response = self.client.chat.completions.create(
-                        model="gpt-4o",
-                        messages=self.conversation_history,
-                        tools=[{"type": "function", "function": spec} for spec in self.function_specs],
-                        temperature=self.temperature  # Use instance temperature setting
-                    )
-                    
-                    # Get the message
-                    message = response.choices[0].message
+                    message = yield from self._stream_chat_completion()
                 except Exception as e:
                     # Handle API errors gracefully
                     self.logger.error(f"Error in API call: {e}")
@@ -1816,7 +1856,7 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                         if tool_call.function.name == "create_visualization":
                             has_bad_visualization_call = True
                             # Try to extract data for direct chart
-                            function_args = json.loads(tool_call.function.arguments)
+                            function_args = orjson.loads(tool_call.function.arguments)
                             visualization_title = function_args.get("title", "Data Visualization")
                             visualization_type = function_args.get("visualization_type")
                             
@@ -1831,7 +1871,7 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                         elif tool_call.function.name == "create_chart":
                             has_bad_visualization_call = True
                             # Extract chart data
-                            function_args = json.loads(tool_call.function.arguments)
+                            function_args = orjson.loads(tool_call.function.arguments)
                             visualization_title = function_args.get("title", "Chart")
                             visualization_data = function_args
                             break
@@ -1901,11 +1941,14 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                     # Initialize force_end_after_iteration flag
                     force_end_after_iteration = False
                     
+                    # Run the regular function calls concurrently up front
+                    tool_results = self._run_tool_calls(message.tool_calls)
+                    
                     # Process each function call
                     for tool_call in message.tool_calls:
                         # Extract function call details
                         function_name = tool_call.function.name
-                        function_args = json.loads(tool_call.function.arguments)
+                        function_args = orjson.loads(tool_call.function.arguments)
                         
                         # Log function call
                         self.logger.info(f"Function call: {function_name}({function_args})")
@@ -2009,7 +2052,9 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                             function_response = None
                             if function_name in self.available_functions:
                                 try:
-                                    function_response = self.available_functions[function_name](**function_args)
+                                    function_response = tool_results[tool_call.id]
+                                    if isinstance(function_response, Exception):
+                                        raise function_response
                                 except Exception as func_error:
                                     # Handle function call errors gracefully
                                     self.logger.error(f"Error calling function {function_name}: {func_error}")
@@ -2034,19 +2079,12 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                             
                         # Make sure function_response is properly JSON serialized
                         if not isinstance(function_response, str):
-                            try:
-                                function_response = json.dumps(function_response)
-                            except Exception as json_error:
-                                self.logger.error(f"Error serializing function response: {json_error}")
-                                function_response = json.dumps({"status": "error", "message": "Error serializing result"})
+                            # json_dumps logs encoding failures and returns an error payload instead
+                            function_response = json_dumps(function_response)
                         
                         # Add function response to conversation history
-                        self.logger.info(f"Adding tool response for tool_call_id={tool_call.id}")
-                        self.conversation_history.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": function_response
-                        })
+                        self.logger.info("Adding tool response for tool_call_id=%s", tool_call.id)
+                        self._append_tool_result(tool_call.id, function_response)
                     
                     # If we need to force end after this iteration, add a system message and break the loop
                     if force_end_after_iteration:
@@ -2145,7 +2183,7 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                             self.conversation_history.append({
                                 "role": "tool",
                                 "tool_call_id": tool_call_id,
-                                "content": json.dumps(function_response)
+                                "content": json_dumps(function_response)
                             })
                         except Exception as func_error:
                             self.logger.error(f"Error calling get_portfolio_projects: {func_error}")
@@ -2153,7 +2191,7 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                             self.conversation_history.append({
                                 "role": "tool",
                                 "tool_call_id": tool_call_id,
-                                "content": json.dumps({"status": "error", "error": str(func_error)})
+                                "content": json_dumps({"status": "error", "error": str(func_error)})
                             })
                         
                         # Continue to next iteration to get a better response
@@ -2171,18 +2209,12 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                         "content": content
                     })
                     
-                    # Implement better streaming that respects markdown formatting
-                    current_chunk = ""
-                    chunks = self._create_streaming_chunks(content)
-                    
-                    # Stream each chunk
-                    for chunk in chunks:
-                        current_chunk += chunk
-                        yield current_chunk
+                    # The text has already been streamed; replace it with the formatted version
+                    yield content
                     
                     # Signal visualization availability if needed
-                    if "visualization" in self.memory or "direct_chart" in self.memory:
-                        yield current_chunk + "\n\n[visualization_available]"
+                    if self._viz is not None or self._direct_chart is not None:
+                        yield content + "\n\n[visualization_available]"
                         
                     return
             
@@ -2193,6 +2225,162 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
             self.logger.error(f"Error generating streaming response: {e}")
             yield f"I'm sorry, I encountered an error while processing your request: {str(e)}"
     
+    def _run_tool_calls(self, tool_calls: List[ChatCompletionMessageToolCall]) -> Dict[str, Any]:
+        """
+        Run the regular function calls among tool_calls.
+        
+        The functions are mostly Asana API calls, so when several are requested
+        they run concurrently in a thread pool. Repeated read-only calls are
+        answered from the tool cache. Intercepted visualization calls and
+        unknown functions are left to the caller.
+        
+        Args:
+            tool_calls: Tool calls from the assistant message
+            
+        Returns:
+            Dictionary mapping each tool call ID to the function's response
+            (already serialized for cached read-only calls), or to the
+            exception it raised
+        """
+        results = {}
+        calls = []
+        cache_keys = {}
+        for tool_call in tool_calls:
+            function_name = tool_call.function.name
+            if function_name in INTERCEPTED_FUNCTIONS or function_name not in self.available_functions:
+                continue
+            function_args = orjson.loads(tool_call.function.arguments)
+            
+            if function_name in CACHEABLE_FUNCTIONS:
+                cache_key = (function_name, orjson.dumps(function_args, option=orjson.OPT_SORT_KEYS))
+                cached_response = self._get_cached_tool_result(cache_key)
+                if cached_response is not None:
+                    self.logger.info(f"Using cached result for function: {function_name}")
+                    results[tool_call.id] = cached_response
+                    continue
+                cache_keys[tool_call.id] = cache_key
+            
+            calls.append((tool_call.id, self.available_functions[function_name], function_args))
+        
+        def call_function(call):
+            try:
+                return call[1](**call[2])
+            except Exception as e:
+                return e
+        
+        if len(calls) == 1:
+            results[calls[0][0]] = call_function(calls[0])
+        elif calls:
+            # Tools read st.session_state, so worker threads need the script run context
+            script_ctx = get_script_run_ctx()
+            
+            def run_call(call):
+                add_script_run_ctx(threading.current_thread(), script_ctx)
+                return call_function(call)
+            
+            with ThreadPoolExecutor(max_workers=min(MAX_TOOL_WORKERS, len(calls))) as executor:
+                for call, result in zip(calls, executor.map(run_call, calls)):
+                    results[call[0]] = result
+        
+        # Cache successful read-only results already serialized, so repeats skip encoding too
+        for tool_call_id, cache_key in cache_keys.items():
+            result = results[tool_call_id]
+            if isinstance(result, Exception) or (isinstance(result, dict) and result.get("status") == "error"):
+                continue
+            if not isinstance(result, str):
+                result = json_dumps(result)
+            results[tool_call_id] = result
+            self._cache_tool_result(cache_key, result)
+        return results
+    
+    def _get_cached_tool_result(self, key: Tuple[str, bytes]) -> Optional[str]:
+        """
+        Look up a fresh tool result in the cache.
+        
+        Args:
+            key: Function name and canonical JSON arguments
+            
+        Returns:
+            Serialized function response, or None if missing or expired
+        """
+        entry = self._tool_cache.get(key)
+        if entry is None:
+            return None
+        
+        timestamp, response = entry
+        if time.time() - timestamp > TOOL_CACHE_TTL_SECONDS:
+            del self._tool_cache[key]
+            return None
+        
+        self._tool_cache.move_to_end(key)
+        return response
+    
+    def _cache_tool_result(self, key: Tuple[str, bytes], response: str) -> None:
+        """
+        Store a tool result, evicting the least recently used entry when full.
+        
+        Args:
+            key: Function name and canonical JSON arguments
+            response: Serialized function response
+        """
+        self._tool_cache[key] = (time.time(), response)
+        self._tool_cache.move_to_end(key)
+        if len(self._tool_cache) > TOOL_CACHE_MAX_ENTRIES:
+            self._tool_cache.popitem(last=False)
+    
+    def _stream_chat_completion(self) -> Generator[str, None, ChatCompletionMessage]:
+        """
+        Stream a chat completion for the current conversation.
+        
+        Yields the response text accumulated so far each time new text arrives,
+        like generate_streaming_response does. Tool call fragments are merged by
+        index as they arrive.
+        
+        Returns:
+            The complete assistant message, with any tool calls
+        """
+        stream = self.client.chat.completions.create(
+            model="gpt-4o",
+            messages=self.conversation_history,
+            tools=OPENAI_TOOLS,
+            temperature=self.temperature,  # Use instance temperature setting
+            stream=True
+        )
+        
+        content = ""
+        tool_call_parts = []  # Per index: {"id", "name", "arguments": [fragments]}
+        for chunk in stream:
+            delta = chunk.choices[0].delta if chunk.choices else None
+            if not delta:
+                continue
+            for tc_delta in delta.tool_calls or ():
+                while len(tool_call_parts) <= tc_delta.index:
+                    tool_call_parts.append({"id": "", "name": "", "arguments": []})
+                parts = tool_call_parts[tc_delta.index]
+                if tc_delta.id:
+                    parts["id"] = tc_delta.id
+                if tc_delta.function:
+                    if tc_delta.function.name:
+                        parts["name"] += tc_delta.function.name
+                    if tc_delta.function.arguments:
+                        parts["arguments"].append(tc_delta.function.arguments)
+            if delta.content:
+                content += delta.content
+                yield content
+        
+        tool_calls = [
+            ChatCompletionMessageToolCall(
+                id=parts["id"],
+                type="function",
+                function=Function(name=parts["name"], arguments="".join(parts["arguments"]))
+            ) for parts in tool_call_parts
+        ]
+        return ChatCompletionMessage(
+            role="assistant",
+            content=content or None,
+            tool_calls=tool_calls or None
+        )
+    
     def _create_streaming_chunks(self, content: str) -> List[str]:
         """
         Create logical streaming chunks that respect markdown structure.
@@ -2446,66 +2634,20 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
         """
         # First, completely clear the conversation history and memory
         self.conversation_history = []
+        self._last_user_query = None
         self.memory = {}
+        self._viz = None
+        self._direct_chart = None
         
         # Get the current portfolio_gid and team_gid
         portfolio_gid = st.session_state.get("portfolio_gid", "")
         team_gid = st.session_state.get("team_gid", "")
         
-        # Add initial critical system message about GIDs
-        initial_system_message = """
-        CRITICAL INSTRUCTION: You are an Asana project management assistant that MUST NEVER ask users for GIDs or IDs of any kind.
-        
-        The correct portfolio_gid=""" + portfolio_gid + """ is ALREADY loaded in the system. Always use this GID automatically without mentioning it.
-        
-        When users ask about portfolio data, projects, or trends, IMMEDIATELY call get_portfolio_projects() with NO arguments.
-        The function will automatically use the correct GID from the session state.
-        
-        For ANY query related to portfolio, workload, or trends, ALWAYS call these functions WITHOUT asking for IDs:
-        1. get_portfolio_projects() - To get all projects
-        2. get_task_distribution_by_assignee() - To analyze workload
-        3. get_task_completion_trend() - To analyze trends
-        
-        NEVER mention, reference, or ask for GIDs in your responses.
-        """
-        
-        # Add the critical system message as the first message
-        self.conversation_history.append({"role": "system", "content": initial_system_message})
-        
-        # Add detailed system message with instructions
-        system_message = """
-        You are an AI assistant for Asana project management. You can access information about Asana projects, tasks, timelines, and resource allocation.
-        
-        IMPORTANT CONFIGURATION:
-        - Portfolio GID: """ + portfolio_gid + """
-        - Team GID: """ + team_gid + """
-        
-        GID HANDLING (CRITICAL):
-        - NEVER ask the user for any GIDs or IDs. This is the single most important rule.
-        - NEVER use placeholder values like 'your_portfolio_gid_here'.
-        - The portfolio_gid (""" + portfolio_gid + """) is ALREADY configured in the system.
-        - The team_gid (""" + team_gid + """) is ALREADY configured in the system.
-        - ALWAYS use these pre-configured GIDs in your function calls automatically without mentioning them to the user.
-        - If a GID is missing or invalid, inform the user they need to configure their portfolio in the app settings.
-        - NEVER mention GIDs in your responses unless reporting an error about configuration.
-        - NEVER, under any circumstances, ask the user to "provide a GID" or any variation of this request.
-        - Instead of asking for GIDs, directly use the tools available with the GIDs that are already configured.
-        
-        VISUALIZATION BEST PRACTICES:
-        - When creating visualizations, ALWAYS use create_direct_chart function, NEVER use deprecated functions.
-        - Always include a descriptive title for any visualization you create.
-        - For resource allocation charts, identify team members with highest/lowest workloads.
-        - For status distributions, highlight the largest categories and what they indicate.
-        """
-        
-        # Add the main system message
-        self.conversation_history.append({"role": "system", "content": system_message})
-        
-        # Add initial assistant message (optional)
-        self.conversation_history.append({
-            "role": "assistant", 
-            "content": "Hello! I can help you analyze your Asana projects by directly accessing your data. What would you like to know?"
-        })
+        # Start over with the system prompt and greeting
+        self.conversation_history = [
+            {"role": "system", "content": SYSTEM_PROMPT_TEMPLATE.format(portfolio_gid=portfolio_gid, team_gid=team_gid)},
+            {"role": "assistant", "content": INITIAL_GREETING}
+        ]
         
         self.logger.info(f"Conversation fully reset and initialized with fresh system instructions")
 
@@ -2554,6 +2696,30 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
         
         return True
 
+    def _trim_conversation_history(self) -> None:
+        """
+        Limit the conversation history to a sliding window of recent messages.
+        
+        The system messages at the start of the history stay pinned; after them
+        only the last MAX_HISTORY_MESSAGES messages are kept. Tool responses
+        left at the start of the window without the assistant message that
+        requested them are dropped too.
+        """
+        history = self.conversation_history
+        pinned = 0
+        while pinned < len(history) and history[pinned].get("role") == "system":
+            pinned += 1
+        
+        if len(history) - pinned <= MAX_HISTORY_MESSAGES:
+            return
+        
+        start = len(history) - MAX_HISTORY_MESSAGES
+        while start < len(history) and history[start].get("role") == "tool":
+            start += 1
+        
+        self.conversation_history = history[:pinned] + history[start:]
+        self.logger.info(f"Conversation history trimmed from {len(history)} to {len(self.conversation_history)} messages")
+    
     def _sanitize_conversation_history(self) -> None:
         """
         Reconstruct the conversation history to ensure it's valid for the OpenAI API.
@@ -2728,11 +2894,11 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
         
         # Add back the user query if provided
         if user_query:
-            self.add_message_to_history("user", user_query)
+            self._append_text_message("user", user_query)
             self.logger.info(f"Re-added user query after emergency reset: {user_query}")
         
         # Reset processed tool call IDs
-        self.processed_tool_call_ids = set()
+        self.processed_tool_call_ids = RecentIdSet()
         
         # Log the change
         new_length = len(self.conversation_history)
@@ -2815,7 +2981,7 @@ Once configured, I'll be able to provide insights about your projects, tasks, an
                         yield current_chunk
                     
                     # Signal visualization availability if needed
-                    if "visualization" in self.memory or "direct_chart" in self.memory:
+                    if self._viz is not None or self._direct_chart is not None:
                         yield current_chunk + "\n\n[visualization_available]"
                         
                 return chunk_generator()
@@ -5,6 +5,7 @@ This module contains the JSON schema definitions for all functions that can be c
 by the LLM through OpenAI's function calling capability.
 
 """
+import functools
 from typing import List, Dict, Any, Union
 # import dataclasses # No longer needed as we use Pydantic models
 from pydantic_core import PydanticUndefined # Import the correct sentinel
@@ -362,10 +363,14 @@ ALL_FUNCTION_DEFINITIONS = (
     REPORTING_FUNCTIONS
 )
 
+@functools.lru_cache(maxsize=1)
 def get_function_definitions() -> List[Dict[str, Any]]:
     """
     Get the full list of function definitions for the assistant.
 
+    The definitions are static, so the list is built and validated once and
+    the same object is returned on later calls; callers must not modify it.
+
     Returns:
         List of function definition dictionaries
     """
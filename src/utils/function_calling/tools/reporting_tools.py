@@ -249,17 +249,16 @@ class ReportingTools(BaseAsanaTools):
             if 'created_at' in df.columns:
                 df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
 
-            # Count completions per day
+            # Count completions per day: format each timestamp once, tally by day,
+            # then line the tallies up with the date range (missing days are 0)
             if 'completed_at' in df.columns:
-                for i, date in enumerate(date_range):
-                    date_str = date.strftime('%Y-%m-%d')
-                    completed_counts[i] = df[df['completed_at'].dt.strftime('%Y-%m-%d') == date_str].shape[0]
+                completed_by_day = df['completed_at'].dt.strftime('%Y-%m-%d').value_counts()
+                completed_counts = completed_by_day.reindex(date_range_str, fill_value=0).tolist()
 
             # Count created tasks per day
             if 'created_at' in df.columns:
-                for i, date in enumerate(date_range):
-                    date_str = date.strftime('%Y-%m-%d')
-                    created_counts[i] = df[df['created_at'].dt.strftime('%Y-%m-%d') == date_str].shape[0]
+                created_by_day = df['created_at'].dt.strftime('%Y-%m-%d').value_counts()
+                created_counts = created_by_day.reindex(date_range_str, fill_value=0).tolist()
 
         # Calculate totals
         total_completed = sum(completed_counts)
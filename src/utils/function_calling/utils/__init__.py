@@ -35,6 +35,7 @@ from src.utils.function_calling.utils.validators import (
     validate_int_range,
     validate_non_empty_string,
     validate_function_args,
+    compile_args_validator,
     validate_chart_data,
     validate_boolean
 )
@@ -43,8 +44,10 @@ from src.utils.function_calling.utils.serialization import (
     dataclass_to_dict,
     DataclassJSONEncoder,
     to_serializable,
+    dataframe_to_records,
     serialize_response,
-    json_dumps
+    json_dumps,
+    to_json_content
 )
 
 __all__ = [
@@ -76,6 +79,7 @@ __all__ = [
     "validate_int_range",
     "validate_non_empty_string",
     "validate_function_args",
+    "compile_args_validator",
     "validate_chart_data",
     "validate_boolean",
     
@@ -83,6 +87,8 @@ __all__ = [
     "dataclass_to_dict",
     "DataclassJSONEncoder",
     "to_serializable",
+    "dataframe_to_records",
     "serialize_response",
-    "json_dumps"
+    "json_dumps",
+    "to_json_content"
 ]
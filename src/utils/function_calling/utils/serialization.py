@@ -9,8 +9,15 @@ import logging
 import dataclasses
 from typing import Any, Dict, List, Optional, Union, Callable
 
+import orjson
+import pandas as pd
+import pyarrow as pa
+
 logger = logging.getLogger(__name__)
 
+# numpy values and non-string dict keys show up in tool results built from DataFrames
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
 
 def dataclass_to_dict(obj: Any) -> Any:
     """
@@ -59,6 +66,27 @@ class DataclassJSONEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
+def dataframe_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Convert a DataFrame to a list of row dictionaries.
+    
+    Goes through an Arrow table, which converts column by column without
+    pandas' intermediate object arrays. Frames Arrow cannot represent (e.g.
+    mixed-type object columns) fall back to DataFrame.to_dict.
+    
+    Args:
+        df: DataFrame to convert
+        
+    Returns:
+        List of dictionaries, one per row
+    """
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False).to_pylist()
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        logger.debug(f"Arrow conversion failed, using DataFrame.to_dict: {str(e)}")
+        return df.to_dict(orient="records")
+
+
 def to_serializable(obj: Any) -> Any:
     """
     Convert an object to a JSON-serializable format.
@@ -74,6 +102,10 @@ def to_serializable(obj: Any) -> Any:
         if dataclasses.is_dataclass(obj):
             return dataclass_to_dict(obj)
         
+        # Convert DataFrames to row records
+        if isinstance(obj, pd.DataFrame):
+            return dataframe_to_records(obj)
+        
         # Handle numpy integer types (int64, etc)
         # Check for numpy module using a string to avoid import errors if numpy is not installed
         if hasattr(obj, 'dtype') and hasattr(obj, 'item') and 'int' in str(obj.dtype):
@@ -124,6 +156,10 @@ def serialize_response(response: Any) -> Dict[str, Any]:
         if dataclasses.is_dataclass(response):
             return dataclass_to_dict(response)
         
+        # DataFrames become a list of row records
+        if isinstance(response, pd.DataFrame):
+            return {"result": dataframe_to_records(response), "status": "success"}
+        
         # Try to convert to JSON to check serializability
         json.dumps(response)
         return {"result": response, "status": "success"}
@@ -140,12 +176,21 @@ def json_dumps(obj: Any) -> str:
     """
     Convert an object to a JSON string, handling dataclass objects.
     
+    orjson is tried first since it encodes dataclasses, numpy values and
+    datetimes natively; anything it rejects goes through to_serializable
+    and the standard library encoder.
+    
     Args:
         obj: Object to convert
         
     Returns:
         JSON string
     """
+    try:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+    except TypeError:
+        pass
+    
     try:
         return json.dumps(to_serializable(obj))
     except Exception as e:
@@ -154,4 +199,24 @@ def json_dumps(obj: Any) -> str:
         return json.dumps({
             "status": "error",
             "error": f"JSON serialization error: {str(e)}"
-        }) 
\ No newline at end of file
+        })
+
+
+def to_json_content(obj: Any) -> str:
+    """
+    Convert a tool response to JSON message content.
+    
+    Responses that are already serialized (str or bytes) are passed through
+    as they are rather than being encoded a second time.
+    
+    Args:
+        obj: Tool response
+        
+    Returns:
+        JSON string
+    """
+    if isinstance(obj, str):
+        return obj
+    if isinstance(obj, bytes):
+        return obj.decode()
+    return json_dumps(obj)
@@ -143,6 +143,58 @@ def validate_function_args(func: Callable[..., T], args: Dict[str, Any]) -> Dict
     return validated_args
 
 
+# Python types accepted for each JSON schema type. "string" is deliberately absent:
+# the chart schema builder uses it as the fallback for annotations it cannot map,
+# so a string-typed property does not reliably describe the expected value.
+_SCHEMA_TYPE_CHECKS = {
+    # JSON Schema counts integral numbers such as 30.0 as integers, and models emit them
+    "integer": lambda value: ((isinstance(value, int) and not isinstance(value, bool))
+                              or (isinstance(value, float) and value.is_integer())),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+}
+
+
+def compile_args_validator(parameters: Dict[str, Any]) -> Callable[[Dict[str, Any]], List[str]]:
+    """
+    Build a validator for a function's arguments from its JSON schema.
+    
+    The schema is read once here; the returned callable only checks required
+    keys and the Python type of each supplied argument, so it is cheap enough
+    to run on every tool call. Integral floats given for integer arguments
+    (e.g. 30.0) are accepted and converted to int in place.
+    
+    Args:
+        parameters: The "parameters" object of a function definition
+        
+    Returns:
+        Callable taking an arguments dictionary and returning a list of
+        validation error messages, empty if valid
+    """
+    required = tuple(parameters.get("required", ()))
+    type_checks = tuple(
+        (name, prop["type"], _SCHEMA_TYPE_CHECKS[prop["type"]])
+        for name, prop in parameters.get("properties", {}).items()
+        if prop.get("type") in _SCHEMA_TYPE_CHECKS
+    )
+    
+    def validate(args: Dict[str, Any]) -> List[str]:
+        errors = [f"Missing required argument '{name}'" for name in required if name not in args]
+        for name, schema_type, check in type_checks:
+            value = args.get(name)
+            if value is None:
+                continue
+            if not check(value):
+                errors.append(f"Argument '{name}' must be of type {schema_type}, got {type(value).__name__}")
+            elif schema_type == "integer" and isinstance(value, float):
+                args[name] = int(value)
+        return errors
+    
+    return validate
+
+
 def validate_chart_data(chart_type: str, data: Dict[str, Any]) -> Dict[str, str]:
     """
     Validate chart data for a specific chart type.
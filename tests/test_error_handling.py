@@ -0,0 +1,75 @@
+"""
+Tests for the retry behaviour of ErrorManager.error_handler.
+"""
+import sys
+from pathlib import Path
+from unittest import mock
+
+import httpx
+from openai import RateLimitError
+
+# Add the project root to the Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.insert(0, project_root)
+
+from src.utils.function_calling.assistant.error_handling import ErrorManager
+
+
+def make_rate_limit_error(headers=None):
+    """Build a RateLimitError like the OpenAI client raises for a 429 response."""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_rate_limit_error_is_retried_after_sleeping():
+    """A rate limited call is retried, waiting as long as the server asks."""
+    error_manager = ErrorManager()
+    calls = []
+    
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise make_rate_limit_error({"retry-after": "2"})
+        return "ok"
+    
+    with mock.patch("src.utils.function_calling.assistant.error_handling.time.sleep") as sleep:
+        result = error_manager.error_handler(flaky)()
+    
+    assert result == "ok"
+    assert len(calls) == 2
+    sleep.assert_called_once_with(2.0)
+
+
+def test_rate_limit_error_without_retry_after_backs_off():
+    """Without a retry-after header the handler still sleeps before retrying."""
+    error_manager = ErrorManager()
+    calls = []
+    
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise make_rate_limit_error()
+        return "ok"
+    
+    with mock.patch("src.utils.function_calling.assistant.error_handling.time.sleep") as sleep:
+        result = error_manager.error_handler(flaky)()
+    
+    assert result == "ok"
+    sleep.assert_called_once()
+    assert 1 <= sleep.call_args[0][0] < 1.1
+
+
+def test_other_errors_are_not_retried():
+    """Errors that are not transient go straight to the tool call error response."""
+    error_manager = ErrorManager()
+    
+    def broken():
+        raise ValueError("bad input")
+    
+    with mock.patch("src.utils.function_calling.assistant.error_handling.time.sleep") as sleep:
+        result = error_manager.error_handler(broken)()
+    
+    assert result["has_error"] is True
+    assert result["error_type"] == "ValueError"
+    sleep.assert_not_called()